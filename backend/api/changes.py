@@ -0,0 +1,144 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.db.models import Q, prefetch_related_objects
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.constants import CHANGES_CHUNK_SIZE, CHANGES_SAFETY_LAG
+from recipes.models import RecipeDeletion
+from recipes.utils import get_deletions_cutoff
+
+
+def encode_changes_token(position):
+    """Кодирует позицию ленты изменений в непрозрачный токен."""
+    data = {
+        key: (position[key][0].isoformat(), position[key][1])
+        for key in ("updated", "deleted")
+        if position[key]
+    }
+    data["synced"] = position["synced"].isoformat()
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_changes_token(token):
+    """
+    Разбирает токен ленты изменений.
+
+    Возвращает позиции последнего изменённого и последнего удалённого
+    рецепта в виде пар (время, id) и время synced, до которого клиент
+    получил все удаления. Без токена лента начинается сначала.
+    """
+    position = {"updated": None, "deleted": None, "synced": None}
+    if not token:
+        return position
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        for key in ("updated", "deleted"):
+            if data.get(key) is not None:
+                moment, pk = data[key]
+                position[key] = (datetime.fromisoformat(moment), int(pk))
+        if data.get("synced") is not None:
+            position["synced"] = datetime.fromisoformat(data["synced"])
+    except (binascii.Error, AttributeError, TypeError, ValueError):
+        raise ValidationError({"since": "Некорректный токен."})
+    if position["synced"] is None:
+        # Токены без synced выданы до хранения удалений ограниченный срок.
+        position["synced"] = position["deleted"] and position["deleted"][0]
+    return position
+
+
+def is_changes_token_expired(token, position):
+    """
+    Проверяет, могли ли удаления после позиции токена уже быть стёрты.
+
+    Отметки об удалении хранятся RECIPE_DELETION_RETENTION_DAYS дней,
+    клиенту с более старым токеном нужна полная синхронизация.
+    """
+    if not token:
+        return False
+    return (
+        position["synced"] is None
+        or position["synced"] < get_deletions_cutoff()
+    )
+
+
+def after(queryset, field, position):
+    """Оставляет строки, идущие в ленте после позиции (время, id)."""
+    if position is None:
+        return queryset
+    moment, pk = position
+    return queryset.filter(
+        Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "id__gt": pk})
+    )
+
+
+def chunked(iterable, size=CHANGES_CHUNK_SIZE):
+    """Делит поток объектов на списки по size штук."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_changes(queryset, position, limit, serialize, prefetch_lookups):
+    """
+    Возвращает строки NDJSON с изменениями рецептов queryset после позиции.
+
+    Сначала идут созданные и изменённые рецепты в порядке (updated_at, id),
+    затем удалённые. Строки читаются серверным курсором пачками, теги и
+    ингредиенты подгружаются отдельными запросами на пачку. Изменения
+    последних CHANGES_SAFETY_LAG секунд не отдаются, чтобы не пропустить
+    транзакции, которые ещё не зафиксированы. Последняя строка содержит
+    токен для следующего запроса, в нём же запоминается время synced, до
+    которого клиент получил все удаления.
+    """
+    position = dict(position)
+    bound = timezone.now() - timedelta(seconds=CHANGES_SAFETY_LAG)
+    created_after = position["updated"] and position["updated"][0]
+    recipes = after(
+        queryset.filter(updated_at__lte=bound),
+        "updated_at",
+        position["updated"],
+    ).order_by("updated_at", "id")[:limit]
+    sent = 0
+    for chunk in chunked(recipes.iterator(chunk_size=CHANGES_CHUNK_SIZE)):
+        prefetch_related_objects(chunk, *prefetch_lookups)
+        for recipe in chunk:
+            change = (
+                "updated"
+                if created_after and recipe.created_at <= created_after
+                else "created"
+            )
+            yield json.dumps(
+                {"type": change, "recipe": serialize(recipe)},
+                ensure_ascii=False,
+            ) + "\n"
+            position["updated"] = (recipe.updated_at, recipe.id)
+        sent += len(chunk)
+    deletions = after(
+        RecipeDeletion.objects.filter(deleted_at__lte=bound),
+        "deleted_at",
+        position["deleted"],
+    ).order_by("deleted_at", "id")[:max(limit - sent, 0)]
+    deleted = 0
+    for deletion in deletions.iterator(chunk_size=CHANGES_CHUNK_SIZE):
+        yield json.dumps(
+            {"type": "deleted", "id": deletion.recipe_id}
+        ) + "\n"
+        position["deleted"] = (deletion.deleted_at, deletion.id)
+        deleted += 1
+    synced = position["synced"] or bound
+    if deleted < limit - sent:
+        synced = bound
+    elif position["deleted"]:
+        synced = max(synced, position["deleted"][0])
+    position["synced"] = synced
+    yield json.dumps(
+        {"type": "token", "token": encode_changes_token(position)}
+    ) + "\n"
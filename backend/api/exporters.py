@@ -0,0 +1,164 @@
+import csv
+import json
+import os
+from functools import lru_cache
+from types import SimpleNamespace
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase import pdfmetrics
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from core.constants import (
+    EXPORT_CHUNK_SIZE,
+    FONT_SIZE_HEADER,
+    FONT_SIZE_INGREDIENTS,
+    INDENT_TOP_REGULAR,
+    INDENT_LEFT_REGULAR,
+    INDENT_AFTER_HEADER,
+    INDENT_BETWEEN_INGREDIENTS,
+)
+
+
+FONT_NAME = "DejaVuSans"
+FONT_PATH = os.path.join(os.path.dirname(__file__), "fonts/dejavusans.ttf")
+SHOPPING_LIST_HEADER = "Ваш список покупок:"
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Разбирает и регистрирует шрифт один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    return FONT_NAME
+
+
+def join_chunks(parts):
+    """Склеивает строки в блоки байтов размером около EXPORT_CHUNK_SIZE."""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+class CSVLineBuffer:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(ingredients):
+    """Выгружает список покупок в виде простого текста."""
+    yield SHOPPING_LIST_HEADER + "\n"
+    for ingredient in ingredients:
+        yield (
+            f"{ingredient['name']}: {ingredient['amount']} "
+            f"{ingredient['measurement']}\n"
+        )
+
+
+def export_csv(ingredients):
+    """Выгружает список покупок в формате CSV."""
+    writer = csv.writer(CSVLineBuffer())
+    yield writer.writerow(("name", "amount", "measurement_unit"))
+    for ingredient in ingredients:
+        yield writer.writerow(
+            (
+                ingredient["name"],
+                ingredient["amount"],
+                ingredient["measurement"],
+            )
+        )
+
+
+def export_json(ingredients):
+    """Выгружает список покупок в виде JSON-массива."""
+    separator = "["
+    for ingredient in ingredients:
+        yield separator + json.dumps(
+            {
+                "name": ingredient["name"],
+                "amount": ingredient["amount"],
+                "measurement_unit": ingredient["measurement"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def build_pdf(ingredients, output):
+    """
+    Создает из списка ингредиентов файл pdf с поддержкой кириллицы.
+
+    output — имя файла или файловый объект, в который записывается документ.
+    """
+    font_name = register_font()
+    pdf = canvas.Canvas(output, pagesize=letter)
+    _, height = letter
+
+    pdf.setFont(font_name, FONT_SIZE_HEADER)
+    position_vertical = height - INDENT_TOP_REGULAR
+
+    pdf.drawString(
+        INDENT_LEFT_REGULAR, position_vertical, SHOPPING_LIST_HEADER
+    )
+    position_vertical -= INDENT_AFTER_HEADER
+
+    pdf.setFont(font_name, FONT_SIZE_INGREDIENTS)
+
+    for ingredient in ingredients:
+        pdf.drawString(
+            INDENT_LEFT_REGULAR,
+            position_vertical,
+            f"{ingredient['name']}: {ingredient['amount']} "
+            f"{ingredient['measurement']}"
+        )
+        position_vertical -= INDENT_BETWEEN_INGREDIENTS
+        if position_vertical < INDENT_TOP_REGULAR:
+            pdf.showPage()
+            pdf.setFont(font_name, FONT_SIZE_INGREDIENTS)
+            position_vertical = height - INDENT_TOP_REGULAR
+
+    pdf.save()
+
+
+PDF_CONTENT_TYPE = "application/pdf"
+
+EXPORTERS = {
+    "txt": ("text/plain; charset=utf-8", export_txt),
+    "csv": ("text/csv; charset=utf-8", export_csv),
+    "json": ("application/json", export_json),
+}
+
+EXPORT_FORMATS = ("pdf", *EXPORTERS)
+
+
+def export_shopping_list(ingredients, export_format):
+    """
+    Возвращает тип содержимого и генератор блоков файла списка покупок.
+
+    Текстовые форматы формируются построчно по мере чтения ингредиентов
+    и не используют reportlab. Pdf рисует модуль pdf_jobs.
+    """
+    content_type, exporter = EXPORTERS[export_format]
+    return content_type, join_chunks(exporter(ingredients))
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Согласование содержимого, не учитывающее параметр format.
+
+    Параметр выбирает формат файла выгрузки, а ошибки по-прежнему
+    отдаются первым подходящим рендерером.
+    """
+
+    settings = SimpleNamespace(URL_FORMAT_OVERRIDE=None)
@@ -3,9 +3,9 @@ from django_filters import (
     NumberFilter,
     FilterSet,
 )
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe
 
 
 class RecipeFilter(FilterSet):
@@ -17,19 +17,28 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = NumberFilter(method="filter_is_in_shopping_cart")
 
     def filter_tags(self, queryset, name, value):
-        """Возвращает рецепты по фильтру "теги" если они существуют."""
-        if not value:
+        """
+        Возвращает рецепты, у которых есть хотя бы один из тегов.
+
+        Теги можно передать несколькими параметрами или через запятую.
+        Фильтр выполняется подзапросом EXISTS по промежуточной таблице,
+        поэтому рецепты не дублируются и DISTINCT не нужен.
+        """
+        tags = {
+            slug
+            for tags_value in self.request.query_params.getlist(name)
+            for slug in tags_value.split(",")
+            if slug
+        }
+        if not tags:
             return queryset
-
-        tags = value.split(",")
-        existing_tags = Tag.objects.filter(slug__in=tags)
-        if not existing_tags.exists():
-            return queryset.none()
-
-        q_objects = Q()
-        for tag in existing_tags:
-            q_objects |= Q(tags__slug=tag.slug)
-        return queryset.filter(q_objects).distinct()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef("pk"), tag__slug__in=tags
+                )
+            )
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         """Возвращает рецепты по фильтру "в избранном"."""
@@ -52,13 +61,3 @@ class RecipeFilter(FilterSet):
     class Meta:
         model = Recipe
         fields = ("author", "tags", "is_favorited", "is_in_shopping_cart")
-
-
-class IngredientFilter(FilterSet):
-    """Фильтр по названию для ингредиентов."""
-
-    name = CharFilter(field_name="name", lookup_expr="icontains")
-
-    class Meta:
-        model = Ingredient
-        fields = ("name",)
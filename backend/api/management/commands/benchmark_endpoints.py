@@ -0,0 +1,585 @@
+import json
+import subprocess
+import tempfile
+from collections import namedtuple
+from itertools import count
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.urls import router
+from recipes.catalog import invalidate_catalog_ids
+from recipes.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+)
+from recipes.search import ingredient_index
+from recipes.shopping_list import add_recipes_to_shopping_list
+from users.models import Subscription
+
+
+User = get_user_model()
+
+PREFIX = "benchmark"
+PASSWORDS = ("Xq7-Lm2p-Rv9t", "Wz4-Kn8s-Tb3y")
+PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA"
+    "1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVO"
+    "RK5CYII="
+)
+PERCENTILES = (50, 90, 99)
+
+Scenario = namedtuple(
+    "Scenario", ("name", "method", "path", "auth", "data", "remember")
+)
+
+
+def scenario(name, method, path, auth=None, data=None, remember=None):
+    return Scenario(name, method, path, auth, data, remember)
+
+
+def recipe_data(state):
+    return {
+        "name": f"{PREFIX} created {next(state['numbers'])}",
+        "image": PNG,
+        "text": PREFIX,
+        "cooking_time": 10,
+        "tags": [state["tag"]],
+        "ingredients": [
+            {"id": ingredient_id, "amount": 10}
+            for ingredient_id in state["ingredients"]
+        ],
+    }
+
+
+def remember_recipe(state, response):
+    state["created"] = json.loads(response.content)["id"]
+
+
+def remember_token(state, response):
+    state["token"] = json.loads(response.content)["auth_token"]
+
+
+SCENARIOS = (
+    scenario("api-root", "get", "/api/"),
+    scenario("users-list", "get", "/api/users/"),
+    scenario("users-list", "get", "/api/users/", "user"),
+    scenario(
+        "users-list",
+        "post",
+        "/api/users/",
+        data=lambda state: {
+            "email": f"{PREFIX}-new-{next(state['numbers'])}@example.com",
+            "username": f"{PREFIX}-new-{next(state['numbers'])}",
+            "first_name": PREFIX,
+            "last_name": PREFIX,
+            "password": PASSWORDS[0],
+        },
+    ),
+    scenario("users-detail", "get", "/api/users/{author}/"),
+    scenario("users-detail", "get", "/api/users/{author}/", "user"),
+    scenario("users-me", "get", "/api/users/me/", "user"),
+    scenario(
+        "users-avatar", "put", "/api/users/me/avatar/", "user",
+        {"avatar": PNG},
+    ),
+    scenario("users-avatar", "delete", "/api/users/me/avatar/", "user"),
+    scenario(
+        "users-set-password", "post", "/api/users/set_password/", "user",
+        {"current_password": PASSWORDS[0], "new_password": PASSWORDS[1]},
+    ),
+    scenario(
+        "users-set-password", "post", "/api/users/set_password/", "user",
+        {"current_password": PASSWORDS[1], "new_password": PASSWORDS[0]},
+    ),
+    scenario(
+        "users-subscriptions", "get", "/api/users/subscriptions/", "user"
+    ),
+    scenario(
+        "users-subscriptions",
+        "get",
+        "/api/users/subscriptions/?recipes_limit=3",
+        "user",
+    ),
+    scenario(
+        "users-subscribe", "post", "/api/users/{author}/subscribe/", "user"
+    ),
+    scenario(
+        "users-subscribe", "delete", "/api/users/{author}/subscribe/", "user"
+    ),
+    scenario("tags-list", "get", "/api/tags/"),
+    scenario("tags-detail", "get", "/api/tags/{tag}/"),
+    scenario("ingredients-list", "get", "/api/ingredients/"),
+    scenario(
+        "ingredients-list", "get", f"/api/ingredients/?name={PREFIX}%201"
+    ),
+    scenario("ingredients-detail", "get", "/api/ingredients/{ingredient}/"),
+    scenario("recipes-list", "get", "/api/recipes/"),
+    scenario("recipes-list", "get", "/api/recipes/", "user"),
+    scenario("recipes-list", "get", "/api/recipes/?tags={tag_slug}"),
+    scenario("recipes-list", "get", "/api/recipes/?author={author}", "user"),
+    scenario("recipes-list", "get", "/api/recipes/?is_favorited=1", "user"),
+    scenario(
+        "recipes-list", "get", "/api/recipes/?is_in_shopping_cart=1", "user"
+    ),
+    scenario("recipes-detail", "get", "/api/recipes/{recipe}/"),
+    scenario("recipes-detail", "get", "/api/recipes/{recipe}/", "user"),
+    scenario(
+        "recipes-list", "post", "/api/recipes/", "user", recipe_data,
+        remember_recipe,
+    ),
+    scenario(
+        "recipes-detail", "patch", "/api/recipes/{created}/", "user",
+        recipe_data,
+    ),
+    scenario("recipes-detail", "delete", "/api/recipes/{created}/", "user"),
+    scenario(
+        "recipes-get-short-link", "get", "/api/recipes/{recipe}/get-link/"
+    ),
+    scenario("recipes-changes", "get", "/api/recipes/changes/?limit=100"),
+    scenario(
+        "recipes-favorite", "post", "/api/recipes/{recipe}/favorite/", "user"
+    ),
+    scenario(
+        "recipes-favorite", "delete", "/api/recipes/{recipe}/favorite/", "user"
+    ),
+    scenario(
+        "recipes-shopping-cart", "post",
+        "/api/recipes/{recipe}/shopping_cart/", "user",
+    ),
+    scenario(
+        "recipes-shopping-cart", "delete",
+        "/api/recipes/{recipe}/shopping_cart/", "user",
+    ),
+    scenario(
+        "recipes-favorite-batch", "post", "/api/recipes/favorite/", "user",
+        lambda state: {"recipes": state["batch"]},
+    ),
+    scenario(
+        "recipes-favorite-batch", "delete", "/api/recipes/favorite/", "user",
+        lambda state: {"recipes": state["batch"]},
+    ),
+    scenario(
+        "recipes-shopping-cart-batch", "post", "/api/recipes/shopping_cart/",
+        "user", lambda state: {"recipes": state["batch"]},
+    ),
+    scenario(
+        "recipes-shopping-cart-batch", "delete",
+        "/api/recipes/shopping_cart/", "user",
+        lambda state: {"recipes": state["batch"]},
+    ),
+    *(
+        scenario(
+            "recipes-download-shopping-cart",
+            "get",
+            f"/api/recipes/download_shopping_cart/?format={export_format}",
+            "user",
+        )
+        for export_format in ("pdf", "txt", "csv", "json")
+    ),
+    scenario(
+        "recipes-shopping-cart-clear", "delete",
+        "/api/recipes/shopping_cart/clear/", "user",
+    ),
+    scenario(
+        "recipes-shopping-cart-batch", "post", "/api/recipes/shopping_cart/",
+        "user", lambda state: {"recipes": state["cart"]},
+    ),
+    scenario(
+        "login", "post", "/api/auth/token/login/",
+        data=lambda state: {
+            "email": state["login_email"], "password": PASSWORDS[0]
+        },
+        remember=remember_token,
+    ),
+    scenario("logout", "post", "/api/auth/token/logout/", "login"),
+)
+
+
+def percentile(values, rank):
+    """Возвращает перцентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(round(rank / 100 * len(values)) - 1, 0)]
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            capture_output=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу тестовым набором данных и прогоняет все маршруты "
+        "API через тестовый клиент от имени анонима и пользователя. "
+        "Записывает перцентили времени ответа, число SQL-запросов и размер "
+        "ответов в JSON. Данные создаются в транзакции, которая в конце "
+        "откатывается."
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ("users", 100, "Количество пользователей."),
+            ("recipes", 1000, "Количество рецептов."),
+            ("ingredients", 500, "Размер справочника ингредиентов."),
+            (
+                "ingredients-per-recipe",
+                8,
+                "Количество ингредиентов в рецепте.",
+            ),
+            ("favorites", 20, "Избранных рецептов у каждого пользователя."),
+            ("carts", 10, "Рецептов в корзине у каждого пользователя."),
+            ("subscriptions", 10, "Подписок у каждого пользователя."),
+            ("repeat", 20, "Сколько раз выполнять каждый запрос."),
+        ):
+            parser.add_argument(
+                f"--{name}", type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            "--output", help="Файл для результатов в формате JSON."
+        )
+        parser.add_argument(
+            "--compare", help="Файл с результатами прошлого запуска."
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] <= options["subscriptions"] + 1:
+            raise CommandError(
+                "Пользователей должно быть хотя бы на 2 больше, чем подписок "
+                "у каждого пользователя."
+            )
+        if (
+            options["recipes"]
+            <= (options["favorites"] + options["carts"] + 11)
+            * options["users"]
+            / (options["users"] - 1)
+        ):
+            raise CommandError(
+                "Рецептов должно хватать на избранное, корзину и ещё 11 "
+                "рецептов других авторов для замеров записи."
+            )
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                baseline = json.load(file)["results"]
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            MEDIA_ROOT=directory,
+            METRICS_DIR=directory,
+            SHOPPING_LIST_PDF_DIR=directory,
+        ), transaction.atomic():
+            state = self.seed(options)
+            self.reset_caches()
+            self.check_coverage()
+            results = self.run_scenarios(state, options["repeat"])
+            transaction.set_rollback(True)
+        self.reset_caches()
+        report = {
+            "revision": get_revision(),
+            "database": connection.vendor,
+            "created_at": timezone.now().isoformat(),
+            "dataset": {
+                name: options[name]
+                for name in (
+                    "users",
+                    "recipes",
+                    "ingredients",
+                    "ingredients_per_recipe",
+                    "favorites",
+                    "carts",
+                    "subscriptions",
+                    "repeat",
+                )
+            },
+            "results": results,
+        }
+        self.print_results(results, baseline)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def reset_caches():
+        """Сбрасывает кеши, которые могли запомнить данные до отката."""
+        invalidate_catalog_ids()
+        ingredient_index.invalidate()
+
+    def seed(self, options):
+        """Создаёт набор данных и возвращает параметры для запросов."""
+        User.objects.bulk_create(
+            User(
+                username=f"{PREFIX}-{number}",
+                email=f"{PREFIX}-{number}@example.com",
+                first_name=PREFIX,
+                last_name=PREFIX,
+            )
+            for number in range(options["users"])
+        )
+        users = list(
+            User.objects.filter(username__startswith=f"{PREFIX}-").order_by(
+                "id"
+            )
+        )
+        user, login_user = users[0], users[-1]
+        for account in (user, login_user):
+            account.set_password(PASSWORDS[0])
+            account.save(update_fields=("password",))
+        token = Token.objects.create(user=user)
+        Tag.objects.bulk_create(
+            Tag(name=f"{PREFIX} {number}", slug=f"{PREFIX}-{number}")
+            for number in range(3)
+        )
+        tags = list(Tag.objects.filter(slug__startswith=f"{PREFIX}-"))
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=f"{PREFIX} {number}", measurement_unit="г")
+                for number in range(options["ingredients"])
+            ),
+            batch_size=1000,
+        )
+        ingredient_ids = list(
+            Ingredient.objects.filter(name__startswith=f"{PREFIX} ")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=users[number % len(users)],
+                    name=f"{PREFIX} recipe {number}",
+                    image="recipes/images/benchmark.png",
+                    text=PREFIX,
+                    cooking_time=1 + number % 60,
+                )
+                for number in range(options["recipes"])
+            ),
+            batch_size=1000,
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(name__startswith=f"{PREFIX} recipe ")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(
+                    recipe_id=recipe_id, tag_id=tags[number % len(tags)].pk
+                )
+                for number, recipe_id in enumerate(recipe_ids)
+            ),
+            batch_size=1000,
+        )
+        per_recipe = min(
+            options["ingredients_per_recipe"], len(ingredient_ids)
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_ids[
+                        (number + offset) % len(ingredient_ids)
+                    ],
+                    amount=1 + offset,
+                )
+                for number, recipe_id in enumerate(recipe_ids)
+                for offset in range(per_recipe)
+            ),
+            batch_size=1000,
+        )
+
+        def pick(number, amount, values):
+            return [
+                values[(number + offset) % len(values)]
+                for offset in range(1, min(amount, len(values) - 1) + 1)
+            ]
+
+        Favorite.objects.bulk_create(
+            (
+                Favorite(user_id=account.pk, recipe_id=recipe_id)
+                for number, account in enumerate(users)
+                for recipe_id in pick(number, options["favorites"], recipe_ids)
+            ),
+            batch_size=1000,
+        )
+        Cart.objects.bulk_create(
+            (
+                Cart(user_id=account.pk, recipe_id=recipe_id)
+                for number, account in enumerate(users)
+                for recipe_id in pick(
+                    number + options["favorites"], options["carts"], recipe_ids
+                )
+            ),
+            batch_size=1000,
+        )
+        for account in users:
+            add_recipes_to_shopping_list(
+                account.pk,
+                Cart.objects.filter(user=account).values_list(
+                    "recipe_id", flat=True
+                ),
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(follower_id=account.pk, following_id=following.pk)
+                for number, account in enumerate(users)
+                for following in pick(number, options["subscriptions"], users)
+            ),
+            batch_size=1000,
+        )
+        busy = set(
+            Favorite.objects.filter(user=user).values_list(
+                "recipe_id", flat=True
+            )
+        ) | set(
+            Cart.objects.filter(user=user).values_list("recipe_id", flat=True)
+        )
+        free = [
+            recipe_id
+            for number, recipe_id in enumerate(recipe_ids)
+            if recipe_id not in busy and number % len(users)
+        ]
+        followed = set(
+            Subscription.objects.filter(follower=user).values_list(
+                "following_id", flat=True
+            )
+        )
+        return {
+            "user_token": token.key,
+            "token": None,
+            "login_email": login_user.email,
+            "author": next(
+                (
+                    account.pk
+                    for account in users[1:]
+                    if account.pk not in followed
+                ),
+                users[1].pk,
+            ),
+            "recipe": free[0],
+            "batch": free[1:11],
+            "cart": list(
+                Cart.objects.filter(user=user).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            "tag": tags[0].pk,
+            "tag_slug": tags[0].slug,
+            "ingredient": ingredient_ids[0],
+            "ingredients": ingredient_ids[:per_recipe],
+            "created": None,
+            "numbers": count(),
+        }
+
+    def check_coverage(self):
+        """Предупреждает о маршрутах API, для которых нет замеров."""
+        covered = {item.name for item in SCENARIOS}
+        missing = sorted(
+            {pattern.name for pattern in router.urls} - covered
+        )
+        if missing:
+            self.stderr.write(
+                f"Нет замеров для маршрутов: {', '.join(missing)}"
+            )
+
+    def request(self, client, item, state):
+        """Выполняет запрос сценария и возвращает ответ и число запросов."""
+        headers = {}
+        if item.auth == "user":
+            headers["HTTP_AUTHORIZATION"] = f"Token {state['user_token']}"
+        elif item.auth == "login":
+            headers["HTTP_AUTHORIZATION"] = f"Token {state['token']}"
+        data = item.data(state) if callable(item.data) else item.data
+        path = item.path.format(**state)
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            response = getattr(client, item.method)(
+                path,
+                data=json.dumps(data) if data is not None else None,
+                content_type="application/json",
+                **headers,
+            )
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = (perf_counter() - started) * 1000
+        if item.remember is not None and response.status_code < 300:
+            item.remember(state, response)
+        return response.status_code, elapsed, len(queries), size
+
+    def run_scenarios(self, state, repeat):
+        client = Client()
+        measurements = {}
+        for _ in range(repeat):
+            keys = set()
+            for item in SCENARIOS:
+                key = (
+                    f"{item.method.upper()} "
+                    f"{item.path.format_map(_Placeholders())} "
+                    f"[{item.auth or 'anonymous'}]"
+                )
+                number = 2
+                while key in keys:
+                    key = f"{key.rsplit(' #', 1)[0]} #{number}"
+                    number += 1
+                keys.add(key)
+                measurements.setdefault(key, []).append(
+                    self.request(client, item, state)
+                )
+        results = {}
+        for key, rows in measurements.items():
+            statuses, timings, queries, sizes = zip(*rows)
+            results[key] = {
+                "statuses": sorted(set(statuses)),
+                "latency_ms": {
+                    f"p{rank}": round(percentile(timings, rank), 3)
+                    for rank in PERCENTILES
+                },
+                "max_ms": round(max(timings), 3),
+                "queries": max(queries),
+                "bytes": max(sizes),
+            }
+        return results
+
+    def print_results(self, results, baseline):
+        self.stdout.write("p50_ms\tp99_ms\tqueries\tbytes\tstatus\tendpoint")
+        for key, result in results.items():
+            latency = result["latency_ms"]
+            line = (
+                f"{latency['p50']:.2f}\t{latency['p99']:.2f}\t"
+                f"{result['queries']}\t{result['bytes']}\t"
+                f"{','.join(map(str, result['statuses']))}\t{key}"
+            )
+            previous = (baseline or {}).get(key)
+            if previous:
+                delta = latency["p50"] - previous["latency_ms"]["p50"]
+                line += (
+                    f"\t(p50 {delta:+.2f} мс, запросов "
+                    f"{result['queries'] - previous['queries']:+d})"
+                )
+            self.stdout.write(line)
+
+
+class _Placeholders(dict):
+    """Оставляет подстановки в пути как есть, чтобы получить ключ замера."""
+
+    def __missing__(self, key):
+        return f"{{{key}}}"
@@ -0,0 +1,117 @@
+import os
+import resource
+import tracemalloc
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from api.exporters import EXPORT_FORMATS, export_shopping_list
+from api.pdf_jobs import get_shopping_list_pdf
+from recipes.models import Ingredient, ShoppingListItem
+from recipes.shopping_list import get_shopping_list
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время и память выгрузки списка покупок во всех форматах "
+        "для списков разного размера. Pdf рисуется тем же пулом "
+        "процессов, что и при выгрузке, поэтому его память замеряется "
+        "только в процессе запроса. Данные создаются в транзакции, "
+        "которая в конце откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=(10, 100, 1000),
+            help="Количество ингредиентов в списке покупок.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Сколько раз повторять каждый замер.",
+        )
+
+    def handle(self, *args, **options):
+        with TemporaryDirectory() as directory, override_settings(
+            SHOPPING_LIST_PDF_DIR=directory
+        ), transaction.atomic():
+            self.run_benchmark(sorted(options["sizes"]), options["repeat"])
+            transaction.set_rollback(True)
+        self.stdout.write(
+            "Пиковый RSS процесса, КБ: "
+            f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}"
+        )
+
+    def run_benchmark(self, sizes, repeat):
+        user = User.objects.create(
+            username="benchmark-export", email="benchmark-export@example.com"
+        )
+        self.stdout.write("ingredients\tformat\tms\tpeak_kb\tbytes")
+        for size in sizes:
+            self.fill_shopping_list(user, size)
+            for export_format in EXPORT_FORMATS:
+                timings, peaks = [], []
+                for _ in range(repeat):
+                    tracemalloc.start()
+                    started = perf_counter()
+                    length = self.export(user, export_format)
+                    timings.append((perf_counter() - started) * 1000)
+                    peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+                    tracemalloc.stop()
+                self.stdout.write(
+                    f"{size}\t{export_format}\t"
+                    f"{sorted(timings)[len(timings) // 2]:.2f}\t"
+                    f"{max(peaks):.0f}\t{length}"
+                )
+
+    @staticmethod
+    def fill_shopping_list(user, size):
+        """Заполняет список покупок пользователя size ингредиентами."""
+        ShoppingListItem.objects.filter(user=user).delete()
+        existing = Ingredient.objects.filter(
+            name__startswith="benchmark ingredient "
+        ).count()
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f"benchmark ingredient {number}",
+                    measurement_unit="г",
+                )
+                for number in range(existing, size)
+            ),
+            batch_size=1000,
+        )
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user=user, ingredient_id=id, amount=100)
+                for id in Ingredient.objects.filter(
+                    name__startswith="benchmark ingredient "
+                ).values_list("id", flat=True)[:size]
+            ),
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def export(user, export_format):
+        """Выгружает список так же, как ответ, и возвращает его размер."""
+        ingredients = get_shopping_list(user.id).iterator()
+        if export_format != "pdf":
+            _, chunks = export_shopping_list(ingredients, export_format)
+            return sum(len(chunk) for chunk in chunks)
+        pdf_file = get_shopping_list_pdf(ingredients, timeout=None)
+        if pdf_file is None:
+            raise CommandError("Pdf рисует другой процесс.")
+        with pdf_file:
+            os.remove(pdf_file.name)
+            return os.fstat(pdf_file.fileno()).st_size
@@ -0,0 +1,117 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from core.constants import OBJ_PER_PAGE
+from recipes.models import Recipe, Tag
+
+
+User = get_user_model()
+
+TAG_SLUGS = ("benchmark-breakfast", "benchmark-lunch", "benchmark-dinner")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет фильтрацию рецептов по тегам на растущем числе рецептов. "
+        "Данные создаются в транзакции, которая в конце откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=(1000, 10000, 50000),
+            help="Количество рецептов для замеров.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Сколько раз повторять каждый замер.",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Выводить план запроса для каждого размера.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run_benchmark(
+                sorted(options["sizes"]), options["repeat"], options["explain"]
+            )
+            transaction.set_rollback(True)
+
+    def run_benchmark(self, sizes, repeat, explain):
+        author = User.objects.create(
+            username="benchmark-author", email="benchmark@example.com"
+        )
+        tags = [Tag.objects.create(name=slug, slug=slug) for slug in TAG_SLUGS]
+        request = Request(
+            RequestFactory().get("/", {"tags": TAG_SLUGS[:2]})
+        )
+        created = 0
+        self.stdout.write("recipes\tpage_ms\tcount_ms\tmatched")
+        for size in sizes:
+            self.create_recipes(author, tags, created, size)
+            created = size
+            queryset = RecipeFilter(
+                request.query_params,
+                queryset=Recipe.objects.all(),
+                request=request,
+            ).qs
+            page_ms = self.measure(
+                lambda: list(queryset[:OBJ_PER_PAGE]), repeat
+            )
+            count_ms = self.measure(queryset.count, repeat)
+            self.stdout.write(
+                f"{size}\t{page_ms:.2f}\t{count_ms:.2f}\t{queryset.count()}"
+            )
+            if explain:
+                self.stdout.write(queryset[:OBJ_PER_PAGE].explain())
+
+    def create_recipes(self, author, tags, start, stop):
+        """Создаёт рецепты с номерами от start до stop и связи с тегами."""
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f"benchmark recipe {number}",
+                    image="recipes/images/benchmark.png",
+                    text="benchmark",
+                    cooking_time=1,
+                )
+                for number in range(start, stop)
+            ),
+            batch_size=1000,
+        )
+        if not recipes or recipes[0].pk is None:
+            recipes = Recipe.objects.filter(
+                author=author, name__startswith="benchmark recipe "
+            ).order_by("id")[start:stop]
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(
+                    recipe_id=recipe.pk, tag_id=tags[number % len(tags)].pk
+                )
+                for number, recipe in enumerate(recipes, start)
+            ),
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def measure(function, repeat):
+        """Возвращает медианное время выполнения функции в миллисекундах."""
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            function()
+            timings.append((perf_counter() - started) * 1000)
+        return sorted(timings)[len(timings) // 2]
@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from core.constants import AVATAR_SIZES, RECIPE_IMAGE_SIZES
+from core.images import build_image_variants, delete_image_variants
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+TARGETS = (
+    (Recipe, "image", "image_variants", RECIPE_IMAGE_SIZES, "updated_at"),
+    (User, "avatar", "avatar_variants", AVATAR_SIZES, None),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт уменьшенные копии фото рецептов и аватаров, для которых "
+        "их ещё нет. Изображения обрабатываются параллельно в нескольких "
+        "процессах."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Количество процессов обработки.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать копии для всех изображений.",
+        )
+
+    def handle(self, *args, **options):
+        for target in TARGETS:
+            self.process(*target, options["workers"], options["force"])
+
+    def process(
+        self, model, field, variants_field, sizes, touch_field, workers, force
+    ):
+        jobs = [
+            (pk, name, variants)
+            for pk, name, variants in model.objects.exclude(
+                **{f"{field}__isnull": True}
+            )
+            .exclude(**{field: ""})
+            .values_list("pk", field, variants_field)
+            .iterator()
+            if force or variants.get("source") != name
+        ]
+        done = failed = 0
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(build_image_variants, name, sizes): (
+                    pk, name, old_variants
+                )
+                for pk, name, old_variants in jobs
+            }
+            for future in as_completed(futures):
+                pk, name, old_variants = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                    continue
+                changes = {variants_field: variants}
+                if touch_field:
+                    changes[touch_field] = timezone.now()
+                if not model.objects.filter(
+                    pk=pk, **{field: name}
+                ).update(**changes):
+                    delete_image_variants(variants)
+                    continue
+                if old_variants.get("source") != name:
+                    delete_image_variants(old_variants)
+                done += 1
+        self.stdout.write(
+            f"{model._meta.label}.{field}: обработано {done}, "
+            f"ошибок {failed}"
+        )
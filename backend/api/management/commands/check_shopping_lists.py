@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Cart, ShoppingListItem
+from recipes.shopping_list import (
+    get_aggregated_shopping_list,
+    rebuild_shopping_lists,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает сохранённые списки покупок с посчитанными по рецептам "
+        "в корзине и при необходимости пересобирает расходящиеся списки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Пересобрать списки покупок с расхождениями.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = set(
+            Cart.objects.values_list("user_id", flat=True).distinct()
+        ) | set(
+            ShoppingListItem.objects.values_list(
+                "user_id", flat=True
+            ).distinct()
+        )
+        mismatched = 0
+        for user_id in sorted(user_ids):
+            with transaction.atomic():
+                expected = {
+                    row["id"]: row["amount"]
+                    for row in get_aggregated_shopping_list(user_id)
+                }
+                stored = dict(
+                    ShoppingListItem.objects.filter(
+                        user_id=user_id
+                    ).values_list("ingredient_id", "amount")
+                )
+                if expected == stored:
+                    continue
+                mismatched += 1
+                self.stdout.write(
+                    f"Пользователь {user_id}: расхождений "
+                    f"{len(expected.items() ^ stored.items())}"
+                )
+                if options["fix"]:
+                    rebuild_shopping_lists((user_id,))
+        self.stdout.write(
+            f"Проверено списков: {len(user_ids)}, "
+            f"с расхождениями: {mismatched}"
+        )
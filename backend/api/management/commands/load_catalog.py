@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.catalog import invalidate_catalog_ids
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import ingredient_index
+
+
+BATCH_SIZE = 1000
+
+DATA_DIR = os.path.join(settings.BASE_DIR, "data")
+
+
+def read_rows(path, fields):
+    """
+    Построчно читает записи справочника из файла csv или json.
+
+    В csv поля идут в порядке fields без заголовка, в json ожидается
+    массив объектов с ключами fields.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8") as file:
+        if extension == ".csv":
+            for row in csv.reader(file):
+                if row:
+                    yield tuple(value.strip() for value in row[:len(fields)])
+        elif extension == ".json":
+            for item in json.load(file):
+                yield tuple(item[field].strip() for field in fields)
+        else:
+            raise CommandError(f"Неизвестный формат файла {path}.")
+
+
+def batches(rows, key, size=BATCH_SIZE):
+    """
+    Делит поток записей на пачки.
+
+    Из записей пачки с одинаковым ключом остаётся последняя, иначе
+    INSERT ... ON CONFLICT изменил бы одну строку дважды.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list({key(row): row for row in islice(rows, size)}.values())
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_ingredients_postgresql(batch):
+    table = Ingredient._meta.db_table
+    placeholders = ", ".join(["(%s, %s)"] * len(batch))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, measurement_unit) "
+            f"VALUES {placeholders} "
+            "ON CONFLICT (name, measurement_unit) DO NOTHING RETURNING id",
+            [value for row in batch for value in row],
+        )
+        return len(cursor.fetchall()), 0
+
+
+def upsert_ingredients(batch):
+    existing = set(
+        Ingredient.objects.filter(
+            name__in=[name for name, _ in batch]
+        ).values_list("name", "measurement_unit")
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit=measurement_unit)
+        for name, measurement_unit in batch
+        if (name, measurement_unit) not in existing
+    )
+    return len(batch) - len(existing & set(batch)), 0
+
+
+def touch_tag_recipes(tag_ids):
+    """Отмечает изменёнными рецепты с переименованными тегами."""
+    if tag_ids:
+        Recipe.objects.filter(
+            pk__in=Recipe.tags.through.objects.filter(
+                tag_id__in=tag_ids
+            ).values("recipe_id")
+        ).update(updated_at=timezone.now())
+
+
+def upsert_tags_postgresql(batch):
+    table = Tag._meta.db_table
+    placeholders = ", ".join(["(%s, %s)"] * len(batch))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, slug) VALUES {placeholders} "
+            "ON CONFLICT (slug) DO UPDATE SET name = EXCLUDED.name "
+            f"WHERE {table}.name IS DISTINCT FROM EXCLUDED.name "
+            "RETURNING id, (xmax = 0)",
+            [value for row in batch for value in row],
+        )
+        rows = cursor.fetchall()
+    updated = [pk for pk, inserted in rows if not inserted]
+    touch_tag_recipes(updated)
+    return len(rows) - len(updated), len(updated)
+
+
+def upsert_tags(batch):
+    existing = {
+        tag.slug: tag
+        for tag in Tag.objects.filter(slug__in=[slug for _, slug in batch])
+    }
+    changed = []
+    for name, slug in batch:
+        tag = existing.get(slug)
+        if tag is not None and tag.name != name:
+            tag.name = name
+            changed.append(tag)
+    Tag.objects.bulk_update(changed, ("name",))
+    touch_tag_recipes([tag.pk for tag in changed])
+    created = Tag.objects.bulk_create(
+        Tag(name=name, slug=slug)
+        for name, slug in batch
+        if slug not in existing
+    )
+    return len(created), len(changed)
+
+
+CATALOGS = (
+    (
+        "ingredients",
+        "ingredients.csv",
+        ("name", "measurement_unit"),
+        lambda row: row,
+        upsert_ingredients_postgresql,
+        upsert_ingredients,
+    ),
+    (
+        "tags",
+        "tags.json",
+        ("name", "slug"),
+        lambda row: row[1],
+        upsert_tags_postgresql,
+        upsert_tags,
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает справочники ингредиентов и тегов из файлов csv или json "
+        "пачками: новые записи добавляются, изменённые обновляются."
+    )
+
+    def add_arguments(self, parser):
+        for name, filename, *_ in CATALOGS:
+            parser.add_argument(
+                f"--{name}",
+                default=os.path.join(DATA_DIR, filename),
+                help=f"Файл справочника, по умолчанию data/{filename}.",
+            )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        with transaction.atomic():
+            for (
+                name, _, fields, key, upsert_postgresql, upsert
+            ) in CATALOGS:
+                if connection.vendor == "postgresql":
+                    upsert = upsert_postgresql
+                total = inserted = updated = 0
+                rows = read_rows(options[name], fields)
+                for batch in batches(rows, key):
+                    batch_inserted, batch_updated = upsert(batch)
+                    total += len(batch)
+                    inserted += batch_inserted
+                    updated += batch_updated
+                self.stdout.write(
+                    f"{name}: добавлено {inserted}, обновлено {updated}, "
+                    f"без изменений {total - inserted - updated}"
+                )
+            transaction.on_commit(ingredient_index.invalidate)
+            transaction.on_commit(invalidate_catalog_ids)
+        self.stdout.write(f"Готово за {perf_counter() - started:.2f} с")
@@ -0,0 +1,69 @@
+import shutil
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import (
+    COLLAPSED_EXTENSION,
+    format_profile,
+    get_profile_path,
+    list_profiles,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Выводит список сохранённых профилей запросов или отчёт по одному "
+        "профилю. Профиль можно сохранить в файл формата pstats или в виде "
+        "свёрнутых стеков для flamegraph."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="Имя профиля.")
+        parser.add_argument(
+            "--sort",
+            default="cumulative",
+            help="Сортировка отчёта pstats, по умолчанию cumulative.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=30,
+            help="Количество строк отчёта.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Сохранить профиль в файл вместо вывода отчёта.",
+        )
+        parser.add_argument(
+            "--collapsed",
+            action="store_true",
+            help="Использовать свёрнутые стеки вместо pstats.",
+        )
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        if name is None:
+            for name, modified, size in list_profiles():
+                moment = datetime.fromtimestamp(modified)
+                self.stdout.write(
+                    f"{moment:%Y-%m-%d %H:%M:%S}\t{size}\t{name}"
+                )
+            return
+        try:
+            path = (
+                get_profile_path(name, COLLAPSED_EXTENSION)
+                if options["collapsed"]
+                else get_profile_path(name)
+            )
+            if options["output"]:
+                shutil.copyfile(path, options["output"])
+            elif options["collapsed"]:
+                with open(path, encoding="utf-8") as file:
+                    self.stdout.write(file.read(), ending="")
+            else:
+                self.stdout.write(
+                    format_profile(name, options["sort"], options["limit"])
+                )
+        except (FileNotFoundError, ValueError) as error:
+            raise CommandError(error)
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Subscription
+
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "in_carts_count", Cart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "following"),
+)
+
+
+def count_related(model, field):
+    """Возвращает подзапрос количества связанных строк."""
+    rows = model.objects.filter(**{field: OuterRef("pk")}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(field).annotate(total=Count("pk")).values("total")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики избранного, списков покупок, рецептов "
+        "и подписчиков и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, ничего не изменяя.",
+        )
+
+    def handle(self, *args, **options):
+        for model, counter, related_model, related_field in COUNTERS:
+            with transaction.atomic():
+                actual = count_related(related_model, related_field)
+                drifted = list(
+                    model.objects.annotate(actual=actual)
+                    .exclude(**{counter: F("actual")})
+                    .values_list("pk", flat=True)
+                )
+                if not options["dry_run"]:
+                    for start in range(0, len(drifted), BATCH_SIZE):
+                        model.objects.filter(
+                            pk__in=drifted[start:start + BATCH_SIZE]
+                        ).update(**{counter: actual})
+            self.stdout.write(
+                f"{model._meta.label}.{counter}: "
+                f"расхождений {len(drifted)}"
+            )
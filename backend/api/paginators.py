@@ -1,6 +1,27 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
 
-from core.constants import OBJ_PER_PAGE
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+
+from .utils import get_cached_list_value, get_list_cache_key
+from core.constants import (
+    COUNT_ESTIMATE_THRESHOLD,
+    LIST_CACHE_TTL,
+    MAX_OBJ_PER_PAGE,
+    OBJ_PER_PAGE,
+)
 
 
 class CustomPaginatorWithLimit(PageNumberPagination):
@@ -8,3 +29,187 @@ class CustomPaginatorWithLimit(PageNumberPagination):
 
     page_size_query_param = "limit"
     page_size = OBJ_PER_PAGE
+    max_page_size = MAX_OBJ_PER_PAGE
+
+
+class CountedDjangoPaginator(DjangoPaginator):
+    """Пагинатор Django, получающий количество объектов через функцию."""
+
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        return self.get_count(self.object_list)
+
+
+class CachedCountPaginator(CustomPaginatorWithLimit):
+    """
+    Постраничный пагинатор с кешированием количества объектов.
+
+    Количество кешируется в общем кеше по нормализованным параметрам
+    фильтрации на LIST_CACHE_TTL секунд и сбрасывается сменой версии при
+    записи. Кешируется только действие list без параметров из атрибута
+    вьюсета user_filter_params: остальные выборки зависят от
+    пользователя. Для списка без
+    фильтров в PostgreSQL берётся оценка планировщика, если таблица
+    достаточно большая. Признак "count_is_exact" в ответе показывает,
+    точное ли количество.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_is_exact = True
+        self.django_paginator_class = partial(
+            CountedDjangoPaginator,
+            get_count=partial(self.get_count, request=request, view=view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset, request, view=None):
+        """Возвращает количество объектов из кеша, оценки или БД."""
+        cache_key = None
+        if getattr(view, "action", None) == "list" and not any(
+            key in request.query_params
+            for key in getattr(view, "user_filter_params", ())
+        ):
+            cache_key = get_list_cache_key("list-count", request, view)
+            version, cached = get_cached_list_value(cache_key)
+            if cached is not None:
+                count, self.count_is_exact = cached
+                return count
+        count = self.estimate_count(queryset, request)
+        self.count_is_exact = count is None
+        if count is None:
+            count = queryset.count()
+        if cache_key is not None:
+            cache.set(
+                cache_key,
+                (version, (count, self.count_is_exact)),
+                LIST_CACHE_TTL,
+            )
+        return count
+
+    def estimate_count(self, queryset, request):
+        """
+        Возвращает оценку количества строк таблицы из pg_class.
+
+        Оценка используется только для запросов без фильтров и для таблиц
+        не меньше COUNT_ESTIMATE_THRESHOLD строк, иначе возвращается None.
+        """
+        connection = connections[queryset.db]
+        if (
+            connection.vendor != "postgresql"
+            or queryset.query.where
+            or queryset.query.distinct
+            or any(
+                key not in ("page", "limit")
+                for key in request.query_params
+            )
+        ):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = %s::regclass",
+                (queryset.model._meta.db_table,),
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.page.paginator.count),
+                    ("count_is_exact", self.count_is_exact),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class RecipeCursorPaginator(CursorPagination):
+    """
+    Пагинатор рецептов по ключу (created_at, id) без подсчёта количества.
+
+    Следующая страница выбирается условием по паре полей, а не через OFFSET,
+    поэтому время ответа не растёт с номером страницы. Курсор непрозрачен
+    для клиента и содержит позицию первого или последнего рецепта страницы.
+    """
+
+    page_size_query_param = "limit"
+    page_size = OBJ_PER_PAGE
+    max_page_size = MAX_OBJ_PER_PAGE
+    ordering = ("-created_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if self.cursor is not None:
+            created_at, pk = self.parse_position(self.cursor.position)
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at)
+                    | Q(created_at=created_at, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, id__lt=pk)
+                )
+        if reverse:
+            queryset = queryset.order_by("created_at", "id")
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def parse_position(self, position):
+        """Разбирает позицию курсора на время создания и id рецепта."""
+        try:
+            created_at, pk = position.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, recipe):
+        return f"{recipe.created_at.isoformat()}|{recipe.id}"
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(
+                offset=0,
+                reverse=False,
+                position=self.get_position(self.page[-1]),
+            )
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(
+                offset=0,
+                reverse=True,
+                position=self.get_position(self.page[0]),
+            )
+        )
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from threading import Lock
+
+from django.conf import settings
+
+from .exporters import build_pdf
+from core.constants import (
+    PDF_CACHE_MAX_BYTES,
+    PDF_RENDER_LOCK_TTL,
+    PDF_RENDER_TIMEOUT,
+    PDF_RENDER_WORKERS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_lock = Lock()
+_executor = None
+_futures = {}
+
+
+class PdfRenderError(Exception):
+    """Не удалось нарисовать pdf списка покупок."""
+
+
+def get_shopping_list_key(ingredients):
+    """Возвращает хеш строк (название, единица, количество) списка."""
+    rows = [
+        (ingredient["name"], ingredient["measurement"], ingredient["amount"])
+        for ingredient in ingredients
+    ]
+    return hashlib.sha256(
+        json.dumps(rows, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def get_pdf_path(key):
+    """Возвращает путь к файлу pdf в кеше по хешу списка."""
+    return os.path.join(settings.SHOPPING_LIST_PDF_DIR, f"{key}.pdf")
+
+
+def get_lock_path(key):
+    """Возвращает путь к файлу блокировки отрисовки списка."""
+    return os.path.join(settings.SHOPPING_LIST_PDF_DIR, f"{key}.lock")
+
+
+def acquire_render_lock(key):
+    """
+    Создаёт файл блокировки отрисовки с флагом O_EXCL.
+
+    Каталог кеша общий для всех процессов приложения, поэтому один и тот
+    же список рисует только один из них. Блокировка старше
+    PDF_RENDER_LOCK_TTL считается оставшейся от упавшего процесса и
+    заменяется. Возвращает False, если список уже рисует другой процесс.
+    """
+    path = get_lock_path(key)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        try:
+            if time.time() - os.stat(path).st_mtime < PDF_RENDER_LOCK_TTL:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def release_render_lock(key):
+    try:
+        os.remove(get_lock_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def render_pdf(ingredients, path):
+    """
+    Рисует pdf во временный файл и атомарно переносит его в кеш.
+
+    Выполняется в процессе пула, поэтому не обращается к базе данных.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        build_pdf(ingredients, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def evict_pdf_cache(max_bytes=PDF_CACHE_MAX_BYTES):
+    """Удаляет давно не использованные файлы, пока кеш больше max_bytes."""
+    files = []
+    with os.scandir(settings.SHOPPING_LIST_PDF_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def open_cached_pdf(path):
+    """Открывает файл из кеша и отмечает его использование."""
+    try:
+        pdf_file = open(path, "rb")
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return pdf_file
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+    return _executor
+
+
+def _finish_render(key, future):
+    with _lock:
+        _futures.pop(key, None)
+    release_render_lock(key)
+    if not future.cancelled() and future.exception() is None:
+        evict_pdf_cache()
+
+
+def submit_render(key, ingredients):
+    """
+    Ставит отрисовку списка в пул процессов, если она ещё не запущена.
+
+    Возвращает Future отрисовки или None, если тот же список уже рисует
+    другой процесс приложения.
+    """
+    global _executor
+    with _lock:
+        future = _futures.get(key)
+        if future is not None:
+            return future
+        os.makedirs(settings.SHOPPING_LIST_PDF_DIR, exist_ok=True)
+        if not acquire_render_lock(key):
+            return None
+        try:
+            try:
+                future = _get_executor().submit(
+                    render_pdf, ingredients, get_pdf_path(key)
+                )
+            except BrokenProcessPool:
+                _executor = None
+                future = _get_executor().submit(
+                    render_pdf, ingredients, get_pdf_path(key)
+                )
+        except BaseException:
+            release_render_lock(key)
+            raise
+        _futures[key] = future
+    future.add_done_callback(partial(_finish_render, key))
+    return future
+
+
+def get_shopping_list_pdf(ingredients, timeout=PDF_RENDER_TIMEOUT):
+    """
+    Возвращает открытый файл pdf списка покупок или None.
+
+    Файл берётся из кеша на диске по хешу содержимого списка. Если его
+    нет, отрисовка ставится в пул процессов и ожидается не дольше timeout
+    секунд. None означает, что файл ещё рисуется и запрос нужно повторить.
+    Если отрисовка не удалась, блокировка снимается и выбрасывается
+    PdfRenderError.
+    """
+    ingredients = list(ingredients)
+    key = get_shopping_list_key(ingredients)
+    pdf_file = open_cached_pdf(get_pdf_path(key))
+    if pdf_file is not None:
+        return pdf_file
+    try:
+        future = submit_render(key, ingredients)
+        if future is not None:
+            future.result(timeout=timeout)
+    except TimeoutError:
+        return None
+    except Exception as error:
+        release_render_lock(key)
+        logger.exception("Не удалось нарисовать pdf списка покупок")
+        raise PdfRenderError from error
+    return open_cached_pdf(get_pdf_path(key))
@@ -1,18 +1,35 @@
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.core.files.storage import default_storage
 from django.db.transaction import atomic
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
+from .utils import delete_rows, get_recipes_limit
 from .validators import get_validated_tags, get_validated_ingredients
-from recipes.models import (
-    Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag
-)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.shopping_list import update_recipe_in_shopping_lists
+from core.constants import MAX_BATCH_RECIPES
 
 
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Адреса уменьшенных копий изображения по размерам и форматам."""
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        urls = {}
+        for size, formats in value.get("sizes", {}).items():
+            urls[size] = {}
+            for image_format, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[size][image_format] = url
+        return urls
+
+
 class UserCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания пользователей."""
 
@@ -45,6 +62,7 @@ class UserSerializer(serializers.ModelSerializer):
     """Сериализатор пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = User
@@ -55,18 +73,30 @@ class UserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_variants",
             "is_subscribed",
         )
 
     def get_is_subscribed(self, obj):
-        """Проверяет подписку текущего пользователя на объект запроса."""
+        """
+        Проверяет подписку текущего пользователя на объект запроса.
+
+        Для списков флаг берётся из аннотации queryset, для отдельного
+        пользователя выполняется запрос.
+        """
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get("request")
-        return (
-            request.user.is_authenticated
-            and request.user.following_subscriptions.filter(
-                following=obj
-            ).exists()
-        )
+        if (
+            request is None
+            or not request.user.is_authenticated
+            or obj.id == request.user.id
+        ):
+            return False
+        return request.user.following_subscriptions.filter(
+            following_id=obj.id
+        ).exists()
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -90,12 +120,15 @@ class AvatarSerializer(serializers.ModelSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe для списка подписок."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
@@ -104,7 +137,7 @@ class SubscriptionsSerializer(UserSerializer):
     """Сериализатор пользователей на которых подписан текущий пользователь."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -115,6 +148,7 @@ class SubscriptionsSerializer(UserSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_variants",
             "is_subscribed",
             "recipes",
             "recipes_count",
@@ -124,23 +158,12 @@ class SubscriptionsSerializer(UserSerializer):
         """Переопределяет метод родительского класса."""
         return True
 
-    def get_recipes_count(self, obj):
-        """Подсчитывает кол-во рецептов у пользователя на которго подписан."""
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
         """Возращает рецепты согласно параметру "recipes_limit" в запросе."""
-        request = self.context.get("request")
-        recipes_limit = request.query_params.get("recipes_limit")
-
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-                recipes = obj.recipes.all()[:recipes_limit]
-            except ValueError:
-                recipes = obj.recipes.all()
-        else:
-            recipes = obj.recipes.all()
+        recipes = self.context.get("recipes_by_author", {}).get(obj.id)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context.get("request"))
+            recipes = obj.recipes.all()[:recipes_limit]
         return ShortRecipeSerializer(
             recipes, many=True, context=self.context
         ).data
@@ -168,6 +191,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
     image = Base64ImageField(required=True)
+    image_variants = ImageVariantsField()
     author = UserSerializer(
         read_only=True, default=serializers.CurrentUserDefault()
     )
@@ -185,6 +209,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
@@ -193,28 +218,45 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
         )
 
+    def to_representation(self, recipe):
+        """Передаёт автору флаг подписки из аннотации рецепта."""
+        is_subscribed = getattr(recipe, "author_is_subscribed", None)
+        if is_subscribed is not None:
+            recipe.author.is_subscribed = is_subscribed
+        return super().to_representation(recipe)
+
     def get_ingredients(self, recipe):
-        """Возвращает список ингредиентов для рецепта."""
-        ingredients = recipe.ingredients.values(
-            "id", "name", "measurement_unit", amount=F("recipe__amount")
-        )
-        return ingredients
+        """
+        Возвращает список ингредиентов для рецепта.
+
+        Если ингредиенты не подгружены заранее, как в ответе на создание и
+        изменение рецепта, они читаются одним запросом вместе со
+        справочником.
+        """
+        items = recipe.ingredient.all()
+        if "ingredient" not in getattr(
+            recipe, "_prefetched_objects_cache", {}
+        ):
+            items = items.select_related("ingredient").order_by(
+                "ingredient__name"
+            )
+        return [
+            {
+                "id": item.ingredient.id,
+                "name": item.ingredient.name,
+                "measurement_unit": item.ingredient.measurement_unit,
+                "amount": item.amount,
+            }
+            for item in items
+        ]
 
     def get_is_favorited(self, recipe):
         """Проверяет есть ли рецепт в избранном."""
-        user = self.context.get("view").request.user
-        return (
-            user.is_authenticated
-            and user.favorite_recipes.filter(recipe=recipe).exists()
-        )
+        return getattr(recipe, "is_favorited", False)
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверяет есть ли рецепт в корзине."""
-        user = self.context.get("view").request.user
-        return (
-            user.is_authenticated
-            and user.cart.filter(recipe=recipe).exists()
-        )
+        return getattr(recipe, "is_in_shopping_cart", False)
 
     def validate_image(self, value):
         """Проверяет, что поле изображение не пустое."""
@@ -267,31 +309,110 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    def _update_tags(self, recipe, tags):
+        """
+        Добавляет и удаляет только изменившиеся теги рецепта.
+
+        Возвращает True, если набор тегов изменился.
+        """
+        old_ids = {tag.id for tag in recipe.tags.all()}
+        new_ids = {int(tag) for tag in tags}
+        recipe_tags = Recipe.tags.through.objects
+        if old_ids - new_ids:
+            delete_rows(
+                recipe_tags.filter(
+                    recipe_id=recipe.pk, tag_id__in=old_ids - new_ids
+                )
+            )
+        recipe_tags.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
+        )
+        return old_ids != new_ids
+
+    def _update_ingredients(self, recipe, ingredients):
+        """
+        Применяет к ингредиентам рецепта только разницу с новым списком.
+
+        Удалённые ингредиенты удаляются, новые добавляются, у остальных
+        обновляется изменившееся количество. Списки покупок меняются на ту
+        же разницу. Возвращает True, если ингредиенты изменились.
+        """
+        old_items = {
+            item.ingredient_id: item for item in recipe.ingredient.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in old_items.items()
+        }
+        new_amounts = {
+            int(ingredient.get("id")): int(ingredient.get("amount"))
+            for ingredient in ingredients
+        }
+        if old_amounts == new_amounts:
+            return False
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            delete_rows(
+                RecipeIngredient.objects.filter(
+                    pk__in=[old_items[pk].pk for pk in removed]
+                )
+            )
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = old_items.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in old_items
+        )
+        update_recipe_in_shopping_lists(recipe.pk, old_amounts, new_amounts)
+        return True
+
     @atomic
     def update(self, recipe, validated_data):
-        """Обновляет рецепт."""
-        new_ingredients = validated_data.pop("ingredients")
-        new_tags = validated_data.pop("tags")
-
-        recipe.tags.clear()
-        recipe.tags.set(new_tags)
-        recipe.ingredients.clear()
-        self._set_ingredients(recipe, new_ingredients)
-
-        return super().update(recipe, validated_data)
-
-
-class AddToCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для добавления рецептов в список покупок."""
+        """
+        Обновляет рецепт.
+
+        Записываются только изменившиеся поля, теги и ингредиенты, а
+        UPDATE рецепта затрагивает только эти поля и updated_at, не
+        перезаписывая счётчики и уменьшенные копии фото. Если ничего не
+        изменилось, рецепт не сохраняется и его updated_at остаётся
+        прежним.
+        """
+        validated_data.pop("author", None)
+        tags_changed = self._update_tags(recipe, validated_data.pop("tags"))
+        ingredients_changed = self._update_ingredients(
+            recipe, validated_data.pop("ingredients")
+        )
+        changed_data = {
+            field: value
+            for field, value in validated_data.items()
+            if field == "image" or getattr(recipe, field) != value
+        }
+        if not (changed_data or tags_changed or ingredients_changed):
+            return recipe
+        for field, value in changed_data.items():
+            setattr(recipe, field, value)
+        recipe.save(update_fields=[*changed_data, "updated_at"])
+        return recipe
 
-    class Meta:
-        model = Cart
-        fields = ("user", "recipe")
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
 
-class AddToFavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для добавления рецептов в список избранных."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES,
+    )
 
-    class Meta:
-        model = Favorite
-        fields = ("user", "recipe")
+    def validate_recipes(self, value):
+        """Убирает повторы, сохраняя порядок id."""
+        return list(dict.fromkeys(value))
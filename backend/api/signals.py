@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .utils import invalidate_list_caches
+from recipes.models import Recipe, Tag
+
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver(post_delete, sender=Tag)
+def invalidate_list_caches_on_recipe_change(sender, **kwargs):
+    """Сбрасывает кеш количества рецептов после записи рецепта."""
+    transaction.on_commit(invalidate_list_caches)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_list_caches_on_user_change(sender, created=True, **kwargs):
+    """Сбрасывает кеш количества пользователей при их создании и удалении."""
+    if created:
+        transaction.on_commit(invalidate_list_caches)
@@ -0,0 +1,674 @@
+import base64
+import io
+import json
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api import pdf_jobs
+from api.changes import encode_changes_token
+from api.writes import add_relation, remove_relation
+from recipes.catalog import get_catalog_version
+from users.models import Subscription
+from recipes.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeDeletion,
+    RecipeIngredient,
+    ShoppingListItem,
+    Tag,
+)
+
+
+User = get_user_model()
+
+RECIPES_COUNT = 12
+
+
+class RecipeDataMixin:
+    """Создаёт авторов, справочники и рецепты для тестов API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        cls.user = User.objects.create_user(
+            username="user", email="user@example.com", password="x"
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [
+            Tag.objects.create(name=f"Тег {number}", slug=f"tag-{number}")
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f"Рецепт {number}",
+                image="recipes/images/recipe.png",
+                text="Описание",
+                cooking_time=10,
+            )
+            for number in range(RECIPES_COUNT)
+        ]
+        for recipe in cls.recipes:
+            recipe.tags.set(cls.tags[:2])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in cls.ingredients[:2]
+            )
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Cart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+
+class RecipeReadQueriesTest(RecipeDataMixin, APITestCase):
+    """Количество запросов к БД при чтении рецептов."""
+
+    def assert_list_queries(self, queries):
+        self.client.get("/api/recipes/")
+        for limit in (2, RECIPES_COUNT):
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = self.client.get(
+                    "/api/recipes/", {"limit": limit}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(5)
+
+    def test_list_authenticated(self):
+        self.authenticate()
+        self.assert_list_queries(7)
+
+    def test_detail_anonymous(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/recipes/{self.recipes[0].pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_authenticated(self):
+        self.authenticate()
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/recipes/{self.recipes[0].pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["is_favorited"])
+        self.assertFalse(response.data["is_in_shopping_cart"])
+
+
+class RecipeDestroyQueriesTest(RecipeDataMixin, APITestCase):
+    """Удаление рецепта не загружает теги и ингредиенты."""
+
+    def test_destroy_skips_prefetch(self):
+        self.client.force_authenticate(self.author)
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(f"/api/recipes/{recipe.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Recipe.objects.filter(pk=recipe.pk).exists())
+        for table in (Tag._meta.db_table, Ingredient._meta.db_table):
+            self.assertFalse(
+                any(
+                    f'"{table}"' in query["sql"]
+                    for query in context.captured_queries
+                ),
+                table,
+            )
+
+
+class SubscriptionFlagTest(RecipeDataMixin, APITestCase):
+    """Флаг is_subscribed у авторов рецептов и в списке пользователей."""
+
+    def setUp(self):
+        super().setUp()
+        Subscription.objects.create(follower=self.user, following=self.author)
+        self.authenticate()
+
+    def test_recipe_author(self):
+        response = self.client.get("/api/recipes/")
+        self.assertTrue(
+            all(
+                recipe["author"]["is_subscribed"]
+                for recipe in response.data["results"]
+            )
+        )
+        response = self.client.get(f"/api/recipes/{self.recipes[0].pk}/")
+        self.assertTrue(response.data["author"]["is_subscribed"])
+
+    def test_users(self):
+        response = self.client.get("/api/users/")
+        self.assertEqual(
+            {
+                user["username"]: user["is_subscribed"]
+                for user in response.data["results"]
+            },
+            {"author": True, "user": False},
+        )
+        response = self.client.get(f"/api/users/{self.author.pk}/")
+        self.assertTrue(response.data["is_subscribed"])
+        response = self.client.get("/api/users/me/")
+        self.assertFalse(response.data["is_subscribed"])
+
+
+class RecipeListEtagTest(RecipeDataMixin, APITestCase):
+    """ETag списка рецептов меняется вместе с данными в ответе."""
+
+    def get_etag(self):
+        response = self.client.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def assert_etag_changes(self, change):
+        etag = self.get_etag()
+        response = self.client.get("/api/recipes/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_author_rename(self):
+        def change():
+            self.author.first_name = "Новое имя"
+            self.author.save()
+
+        self.assert_etag_changes(change)
+
+    def test_author_login_keeps_etag(self):
+        etag = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=("last_login",))
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_author_password_keeps_etag(self):
+        etag = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.set_password("new-password")
+            self.author.save()
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_tag_rename(self):
+        def change():
+            self.tags[0].name = "Новый тег"
+            self.tags[0].save()
+
+        self.assert_etag_changes(change)
+
+    def test_tag_delete(self):
+        self.assert_etag_changes(self.tags[1].delete)
+
+    def test_recipe_delete(self):
+        self.assert_etag_changes(self.recipes[5].delete)
+
+    def test_etag_skips_count(self):
+        self.get_etag()
+        with CaptureQueriesContext(connection) as context:
+            self.get_etag()
+        self.assertFalse(
+            any(
+                "COUNT(" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_ingredient_rename(self):
+        def change():
+            self.ingredients[0].measurement_unit = "кг"
+            self.ingredients[0].save()
+
+        self.assert_etag_changes(change)
+
+
+class ShoppingListPdfTest(RecipeDataMixin, APITestCase):
+    """Ошибка отрисовки pdf отдаётся клиенту и снимает блокировку."""
+
+    def test_render_error(self):
+        self.authenticate()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with TemporaryDirectory() as directory, override_settings(
+            SHOPPING_LIST_PDF_DIR=directory
+        ), mock.patch.object(
+            pdf_jobs, "_get_executor", return_value=executor
+        ), mock.patch.object(
+            pdf_jobs, "build_pdf", side_effect=OSError("шрифт не найден")
+        ), self.assertLogs(
+            pdf_jobs.logger, "ERROR"
+        ):
+            response = self.client.get("/api/recipes/download_shopping_cart/")
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("errors", response.data)
+
+
+class BatchCollectionTest(RecipeDataMixin, APITestCase):
+    """Пакетное добавление и удаление рецептов в корзине и избранном."""
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def get_statuses(self, response):
+        return {
+            result["id"]: result["status"]
+            for result in response.data["results"]
+        }
+
+    def get_counters(self, field):
+        return dict(Recipe.objects.values_list("pk", field))
+
+    def test_add_to_cart(self):
+        recipes = self.recipes
+        response = self.client.post(
+            "/api/recipes/shopping_cart/",
+            {"recipes": [recipes[1].pk, recipes[2].pk, 10 ** 6]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get_statuses(response),
+            {
+                recipes[1].pk: "already_added",
+                recipes[2].pk: "added",
+                10 ** 6: "not_found",
+            },
+        )
+        counters = self.get_counters("in_carts_count")
+        self.assertEqual(counters[recipes[1].pk], 0)
+        self.assertEqual(counters[recipes[2].pk], 1)
+        self.assertEqual(
+            set(
+                ShoppingListItem.objects.filter(user=self.user).values_list(
+                    "ingredient_id", "amount"
+                )
+            ),
+            {(ingredient.pk, 100) for ingredient in self.ingredients[:2]},
+        )
+
+    def test_remove_from_favorite(self):
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            favorites_count=1
+        )
+        response = self.client.delete(
+            "/api/recipes/favorite/",
+            {"recipes": [self.recipes[0].pk, self.recipes[2].pk]},
+            format="json",
+        )
+        self.assertEqual(
+            self.get_statuses(response),
+            {self.recipes[0].pk: "removed", self.recipes[2].pk: "not_in_list"},
+        )
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            self.get_counters("favorites_count")[self.recipes[0].pk], 0
+        )
+
+    def test_clear_cart(self):
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(in_carts_count=2)
+        Cart.objects.create(user=self.author, recipe=self.recipes[1])
+        response = self.client.delete("/api/recipes/shopping_cart/clear/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertTrue(Cart.objects.filter(user=self.author).exists())
+        self.assertEqual(
+            self.get_counters("in_carts_count")[self.recipes[1].pk], 1
+        )
+
+
+class RelationWritesMixin:
+    """Одиночное добавление и удаление избранного, корзины и подписок."""
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.recipe = self.recipes[2]
+
+    def get_counter(self, obj, field):
+        return type(obj).objects.values_list(field, flat=True).get(pk=obj.pk)
+
+    def assert_relation(self, url, obj, counter):
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_counter(obj, counter), 1)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_counter(obj, counter), 1)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_counter(obj, counter), 0)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_counter(obj, counter), 0)
+
+    def test_favorite(self):
+        self.assert_relation(
+            f"/api/recipes/{self.recipe.pk}/favorite/",
+            self.recipe,
+            "favorites_count",
+        )
+
+    def test_shopping_cart(self):
+        self.assert_relation(
+            f"/api/recipes/{self.recipe.pk}/shopping_cart/",
+            self.recipe,
+            "in_carts_count",
+        )
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.user).exists()
+        )
+
+    def test_subscribe(self):
+        self.assert_relation(
+            f"/api/users/{self.author.pk}/subscribe/",
+            self.author,
+            "followers_count",
+        )
+
+    def test_unknown_target(self):
+        for url in (
+            "/api/recipes/1000000/favorite/",
+            "/api/recipes/1000000/shopping_cart/",
+            "/api/users/1000000/subscribe/",
+        ):
+            for method in (self.client.post, self.client.delete):
+                with self.subTest(url=url, method=method.__name__):
+                    self.assertEqual(method(url).status_code, 404)
+
+
+class RelationWritesFallbackTest(
+    RelationWritesMixin, RecipeDataMixin, APITestCase
+):
+    """Запись связей через ORM, которой пользуются СУБД кроме PostgreSQL."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch(
+            "api.writes.connection", mock.Mock(vendor="sqlite")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "Запросы только для PostgreSQL"
+)
+class RelationWritesPostgreSQLTest(
+    RelationWritesMixin, RecipeDataMixin, APITestCase
+):
+    """Запись связей одним запросом в PostgreSQL."""
+
+    def test_single_statement(self):
+        args = (
+            Favorite, "user", "recipe", "favorites_count",
+            self.user.pk, self.recipe.pk,
+        )
+        with self.assertNumQueries(1):
+            recipe = add_relation(*args)
+        self.assertTrue(recipe.added)
+        with self.assertNumQueries(1):
+            self.assertEqual(tuple(remove_relation(*args)), (True, True))
+        with self.assertNumQueries(1):
+            self.assertEqual(tuple(remove_relation(*args)), (True, False))
+
+
+class RecipeUpdateQueriesTest(RecipeDataMixin, APITestCase):
+    """PATCH рецепта записывает только изменившиеся данные."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.recipe = self.recipes[0]
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=5)
+        get_catalog_version()
+
+    def patch(self, tags):
+        return self.client.patch(
+            f"/api/recipes/{self.recipe.pk}/",
+            {
+                "tags": [tag.pk for tag in tags],
+                "ingredients": [
+                    {"id": ingredient.pk, "amount": 100}
+                    for ingredient in self.ingredients[:2]
+                ],
+            },
+            format="json",
+        )
+
+    def test_no_changes(self):
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        with self.assertNumQueries(14) as context:
+            response = self.patch(self.tags[:2])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            any(
+                query["sql"].startswith(("UPDATE", "INSERT", "DELETE"))
+                for query in context.captured_queries
+            )
+        )
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).updated_at, updated_at
+        )
+
+    def test_tags_only(self):
+        with self.assertNumQueries(17) as context:
+            response = self.patch(self.tags[1:])
+        self.assertEqual(response.status_code, 200)
+        updates = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(f'UPDATE "{Recipe._meta.db_table}"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "updated_at"', updates[0])
+        self.assertNotIn("favorites_count", updates[0])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).favorites_count, 5
+        )
+
+
+class RecipeDeletedCatalogTest(APITransactionTestCase):
+    """Ингредиент, удалённый после проверки по снимку, даёт ошибку 400."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.client.force_authenticate(self.author)
+        # Варианты картинки не нужны, а файла рецепта на диске нет.
+        patcher = mock.patch("recipes.signals.schedule_image_variants")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tag = Tag.objects.create(name="Тег", slug="tag")
+        self.ingredient = Ingredient.objects.create(
+            name="Ингредиент", measurement_unit="г"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Рецепт",
+            image="recipes/images/recipe.png",
+            text="Описание",
+            cooking_time=10,
+        )
+        self.recipe.tags.add(self.tag)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=100
+        )
+        patcher = mock.patch(
+            "api.validators.ingredient_ids.get_missing", return_value=set()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_update(self):
+        response = self.client.patch(
+            f"/api/recipes/{self.recipe.pk}/",
+            {
+                "tags": [self.tag.pk],
+                "ingredients": [{"id": 10 ** 6, "amount": 100}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("errors", response.data)
+        self.assertEqual(
+            list(
+                RecipeIngredient.objects.values_list(
+                    "ingredient_id", flat=True
+                )
+            ),
+            [self.ingredient.pk],
+        )
+
+
+class RecipeListCountCacheTest(RecipeDataMixin, APITestCase):
+    """Количество рецептов в списке кешируется по параметрам фильтрации."""
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/recipes/", params)
+        self.assertEqual(response.status_code, 200)
+        counts = [
+            query["sql"]
+            for query in context.captured_queries
+            if "COUNT(*)" in query["sql"]
+            and Recipe._meta.db_table in query["sql"]
+        ]
+        return response.data["count"], len(counts)
+
+    def test_filtered_count_is_cached(self):
+        params = {"author": self.author.pk}
+        self.assertEqual(self.count_queries(params), (RECIPES_COUNT, 1))
+        self.assertEqual(self.count_queries(params), (RECIPES_COUNT, 0))
+        self.assertEqual(
+            self.count_queries({"author": self.user.pk}), (0, 1)
+        )
+
+    @mock.patch("recipes.signals.schedule_image_variants")
+    def test_recipe_create_invalidates(self, schedule_image_variants):
+        params = {"author": self.author.pk}
+        self.count_queries(params)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.author,
+                name="Новый рецепт",
+                image="recipes/images/recipe.png",
+                text="Описание",
+                cooking_time=10,
+            )
+        self.assertEqual(self.count_queries(params), (RECIPES_COUNT + 1, 1))
+
+    def test_user_filters_are_not_cached(self):
+        self.authenticate()
+        params = {"is_favorited": 1}
+        self.assertEqual(self.count_queries(params), (1, 1))
+        self.assertEqual(self.count_queries(params), (1, 1))
+
+
+def get_image_data():
+    """Возвращает картинку 1x1 в формате data URI для тела запроса."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, "PNG")
+    return (
+        "data:image/png;base64,"
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class RecipeCreateQueriesTest(RecipeDataMixin, APITestCase):
+    """Ответ на создание рецепта читает ингредиенты одним запросом."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        get_catalog_version()
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = override_settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        patcher = mock.patch("recipes.signals.schedule_image_variants")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create(self):
+        with self.assertNumQueries(19):
+            response = self.client.post(
+                "/api/recipes/",
+                {
+                    "name": "Новый рецепт",
+                    "text": "Описание",
+                    "cooking_time": 5,
+                    "image": get_image_data(),
+                    "tags": [self.tags[0].pk],
+                    "ingredients": [
+                        {"id": ingredient.pk, "amount": 10}
+                        for ingredient in self.ingredients
+                    ],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["ingredients"]), 3)
+
+
+class RecipeChangesRetentionTest(RecipeDataMixin, APITestCase):
+    """Отметки об удалении хранятся ограниченный срок."""
+
+    def get_token(self, since=None):
+        response = self.client.get(
+            "/api/recipes/changes/", {"since": since} if since else {}
+        )
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).splitlines()
+        return json.loads(lines[-1])["token"]
+
+    def test_recipe_delete_prunes_old_deletions(self):
+        old = RecipeDeletion.objects.create(recipe_id=0)
+        RecipeDeletion.objects.filter(pk=old.pk).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+        recipe_id = self.recipes[0].pk
+        self.recipes[0].delete()
+        self.assertEqual(
+            list(RecipeDeletion.objects.values_list("recipe_id", flat=True)),
+            [recipe_id],
+        )
+
+    def test_fresh_token(self):
+        token = self.get_token()
+        self.assertTrue(self.get_token(token))
+
+    def test_expired_token(self):
+        moment = timezone.now() - timedelta(days=31)
+        token = encode_changes_token(
+            {"updated": (moment, 1), "deleted": None, "synced": moment}
+        )
+        response = self.client.get("/api/recipes/changes/", {"since": token})
+        self.assertEqual(response.status_code, 410)
@@ -1,55 +1,342 @@
-import io
-import os
-
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-
-from core.constants import (
-    FONT_SIZE_HEADER,
-    FONT_SIZE_INGREDIENTS,
-    INDENT_TOP_REGULAR,
-    INDENT_LEFT_REGULAR,
-    INDENT_AFTER_HEADER,
-    INDENT_BETWEEN_INGREDIENTS
+import hashlib
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    Subquery,
+    Window,
 )
+from django.db.models.functions import Greatest, RowNumber
+
+from core.constants import LIST_CACHE_VERSION_KEY, MAX_RECIPES_LIMIT
+from recipes.models import Cart, Favorite, Recipe, RecipeDeletion
+from users.models import Subscription
+
+
+User = get_user_model()
+
+
+def update_counter(queryset, field, delta):
+    """Атомарно изменяет счётчик, не опуская его ниже нуля."""
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
 
+def delete_rows(queryset, returning=None):
+    """
+    Удаляет строки одним DELETE без загрузки объектов.
 
-def generate_pdf(ingredients):
-    """Создает из списка ингредиентов файл pdf с поддержкой кириллицы."""
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    _, height = letter
+    Сигналы удаления не отправляются, поэтому зависимые данные вызывающий
+    код обновляет сам. Если передано поле returning, возвращает список его
+    значений у удалённых строк: в PostgreSQL через DELETE ... RETURNING, в
+    остальных СУБД значения читаются перед удалением.
+    """
+    opts = queryset.model._meta
+    database = connections[queryset.db]
+    postgresql = database.vendor == "postgresql"
+    deleted = []
+    if returning is not None and not postgresql:
+        deleted = list(queryset.values_list(returning, flat=True))
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    sql = f"DELETE FROM {opts.db_table} WHERE {opts.pk.column} IN ({sql})"
+    if returning is not None and postgresql:
+        sql += f" RETURNING {opts.get_field(returning).column}"
+    with database.cursor() as cursor:
+        cursor.execute(sql, params)
+        if returning is not None and postgresql:
+            deleted = [row[0] for row in cursor.fetchall()]
+    return deleted
 
-    current_dir = os.path.dirname(__file__)
-    font_path = os.path.join(current_dir, "fonts/dejavusans.ttf")
 
-    pdfmetrics.registerFont(TTFont("DejaVuSans", font_path))
-    pdf.setFont("DejaVuSans", FONT_SIZE_HEADER)
-    position_vertical = height - INDENT_TOP_REGULAR
+def _add_recipes_to_collection_postgresql(model, counter, user_id, ids):
+    """
+    Добавляет рецепты в коллекцию одним запросом.
 
-    pdf.drawString(
-        INDENT_LEFT_REGULAR, position_vertical, "Ваш список покупок:"
+    Возвращает пары (id рецепта, добавлен). Вставка идёт с ON CONFLICT DO
+    NOTHING, а счётчики увеличиваются только у рецептов из RETURNING,
+    поэтому параллельные запросы не добавляют рецепт дважды.
+    """
+    table = model._meta.db_table
+    user_column = model._meta.get_field("user").column
+    recipe_column = model._meta.get_field("recipe").column
+    recipe_table = Recipe._meta.db_table
+    recipe_pk = Recipe._meta.pk.column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH target AS (SELECT {recipe_pk} AS id FROM {recipe_table} "
+            f"WHERE {recipe_pk} = ANY(%s::bigint[])), "
+            f"inserted AS (INSERT INTO {table} ({user_column}, "
+            f"{recipe_column}) SELECT %s, id FROM target ORDER BY id "
+            f"ON CONFLICT DO NOTHING RETURNING {recipe_column}), "
+            f"counted AS (UPDATE {recipe_table} "
+            f"SET {counter} = {counter} + 1 "
+            f"WHERE {recipe_pk} IN (SELECT {recipe_column} FROM inserted) "
+            f"RETURNING {recipe_pk} AS id) "
+            "SELECT target.id, target.id IN (SELECT id FROM counted) "
+            "FROM target",
+            (list(ids), user_id),
+        )
+        return cursor.fetchall()
+
+
+def add_recipes_to_collection(model, counter, user_id, recipe_ids):
+    """
+    Добавляет рецепты в избранное или корзину пользователя.
+
+    Возвращает статусы по каждому id и множество добавленных рецептов.
+    В PostgreSQL проверка рецептов, вставка и обновление счётчиков
+    выполняются одним запросом. В остальных СУБД существующие рецепты и
+    уже добавленные записи определяются одним запросом, новые записи
+    вставляются одним INSERT, счётчики обновляются одним UPDATE.
+    """
+    if connection.vendor == "postgresql":
+        present = dict(
+            _add_recipes_to_collection_postgresql(
+                model, counter, user_id, recipe_ids
+            )
+        )
+        added = {pk for pk, is_added in present.items() if is_added}
+    else:
+        present = dict(
+            Recipe.objects.filter(pk__in=recipe_ids)
+            .annotate(
+                is_added=Exists(
+                    model.objects.filter(
+                        user_id=user_id, recipe=OuterRef("pk")
+                    )
+                )
+            )
+            .values_list("pk", "is_added")
+        )
+        added = {pk for pk, is_added in present.items() if not is_added}
+        model.objects.bulk_create(
+            (model(user_id=user_id, recipe_id=pk) for pk in added),
+            ignore_conflicts=True,
+        )
+        update_counter(Recipe.objects.filter(pk__in=added), counter, 1)
+    statuses = {
+        pk: "added" if pk in added
+        else "already_added" if pk in present
+        else "not_found"
+        for pk in recipe_ids
+    }
+    return statuses, added
+
+
+def remove_recipes_from_collection(model, counter, user_id, recipe_ids):
+    """
+    Убирает рецепты из избранного или корзины пользователя.
+
+    Возвращает статусы по каждому id и множество убранных рецептов.
+    Записи удаляются одним DELETE, счётчики обновляются одним UPDATE
+    только у рецептов, которые вернул DELETE.
+    """
+    removed = set(
+        delete_rows(
+            model.objects.filter(user_id=user_id, recipe_id__in=recipe_ids),
+            "recipe_id",
+        )
+    )
+    update_counter(Recipe.objects.filter(pk__in=removed), counter, -1)
+    statuses = {
+        pk: "removed" if pk in removed else "not_in_list"
+        for pk in recipe_ids
+    }
+    return statuses, removed
+
+
+def get_recipes_limit(request):
+    """
+    Возвращает лимит рецептов из параметра "recipes_limit" запроса.
+
+    Лимит не может превышать MAX_RECIPES_LIMIT, некорректное значение
+    заменяется максимальным.
+    """
+    try:
+        recipes_limit = int(request.query_params.get("recipes_limit"))
+    except (TypeError, ValueError):
+        return MAX_RECIPES_LIMIT
+    return max(0, min(recipes_limit, MAX_RECIPES_LIMIT))
+
+
+def get_limited_recipes(author_ids, recipes_limit):
+    """
+    Возвращает по recipes_limit последних рецептов каждого автора.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER() в разрезе автора,
+    поэтому выборка для всей страницы авторов делается одним запросом.
+    """
+    if not author_ids:
+        return {}
+    ranked_recipes = (
+        Recipe.objects.filter(author_id__in=author_ids)
+        .annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("created_at").desc(), F("id").desc()),
+            )
+        )
+        .values(
+            "id",
+            "author_id",
+            "name",
+            "image",
+            "image_variants",
+            "cooking_time",
+            "recipe_rank",
+        )
+        .order_by()
     )
-    position_vertical -= INDENT_AFTER_HEADER
-
-    pdf.setFont("DejaVuSans", FONT_SIZE_INGREDIENTS)
-
-    for ingredient in ingredients:
-        name = ingredient.get("name")
-        measurement = ingredient.get("measurement")
-        amount = ingredient.get("amount")
-        pdf.drawString(
-            INDENT_LEFT_REGULAR,
-            position_vertical,
-            f"{name}: {amount} {measurement}"
-        )
-        position_vertical -= INDENT_BETWEEN_INGREDIENTS
-        if position_vertical < INDENT_TOP_REGULAR:
-            pdf.showPage()
-            position_vertical = height - INDENT_TOP_REGULAR
-
-    pdf.save()
-    buffer.seek(0)
-    return buffer
+    sql, params = ranked_recipes.query.sql_with_params()
+    recipes = Recipe.objects.raw(
+        f"SELECT * FROM ({sql}) ranked_recipes "
+        "WHERE recipe_rank <= %s ORDER BY author_id, recipe_rank",
+        (*params, recipes_limit),
+    )
+    recipes_by_author = {author_id: [] for author_id in author_ids}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+def get_list_cache_key(prefix, request, view=None):
+    """
+    Возвращает ключ кеша для списка объектов.
+
+    Ключ учитывает вьюсет, действие и параметры фильтрации без параметров
+    пагинации.
+    """
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+        if key not in ("page", "limit", "cursor", "pagination")
+    )
+    digest = hashlib.md5(
+        repr(
+            (
+                getattr(view, "basename", None),
+                getattr(view, "action", None),
+                params,
+            )
+        ).encode()
+    ).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def get_cached_list_value(cache_key):
+    """
+    Возвращает пару (версия списков, значение из кеша или None).
+
+    Значение хранится вместе с версией, при которой оно посчитано, и
+    читается одним запросом к кешу вместе с текущей версией. Если номера
+    версии в кеше нет, он заводится от текущего времени, чтобы не
+    совпасть с версией уже закешированных значений.
+    """
+    cached = cache.get_many((LIST_CACHE_VERSION_KEY, cache_key))
+    version = cached.get(LIST_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(LIST_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.get(LIST_CACHE_VERSION_KEY), None
+    value = cached.get(cache_key)
+    if value is None or value[0] != version:
+        return version, None
+    return version, value[1]
+
+
+def invalidate_list_caches():
+    """Делает недействительными все закешированные данные списков."""
+    try:
+        cache.incr(LIST_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(LIST_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _make_etag(*parts, weak=False):
+    """Собирает ETag из хеша переданных значений."""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def get_recipe_etag(recipe):
+    """
+    Возвращает строгий ETag рецепта.
+
+    Кроме времени изменения рецепта учитываются данные автора и флаги
+    текущего пользователя, так как они тоже попадают в ответ.
+    """
+    author = recipe.author
+    return _make_etag(
+        recipe.pk,
+        recipe.updated_at,
+        author.username,
+        author.email,
+        author.first_name,
+        author.last_name,
+        author.avatar.name,
+        author.avatar_variants,
+        getattr(recipe, "author_is_subscribed", False),
+        getattr(recipe, "is_favorited", False),
+        getattr(recipe, "is_in_shopping_cart", False),
+    )
+
+
+def _get_rows_summary(queryset, field):
+    """Возвращает подзапросы количества и максимального id строк."""
+    rows = queryset.filter(**{field: OuterRef("pk")}).order_by().values(field)
+    return (
+        Subquery(rows.annotate(total=Count("id")).values("total")),
+        Subquery(rows.annotate(last_id=Max("id")).values("last_id")),
+    )
+
+
+def get_recipe_list_etag(request):
+    """
+    Возвращает слабый ETag списка рецептов.
+
+    Учитывает время последнего изменения и последнего удаления рецептов,
+    параметры запроса, а для авторизованного пользователя ещё и состояние
+    его избранного, корзины и подписок. Оба времени берутся по индексам
+    одним запросом без обхода выборки: любое изменение данных рецепта в
+    ответе обновляет его updated_at, а удаление оставляет отметку в
+    RecipeDeletion.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (SELECT MAX(updated_at) FROM {Recipe._meta.db_table}), "
+            "(SELECT MAX(deleted_at) FROM "
+            f"{RecipeDeletion._meta.db_table})"
+        )
+        last_modified, last_deleted = cursor.fetchone()
+    parts = [
+        last_modified,
+        last_deleted,
+        sorted(request.query_params.lists()),
+    ]
+    user = request.user
+    if user.is_authenticated:
+        favorites_total, favorites_last = _get_rows_summary(
+            Favorite.objects, "user"
+        )
+        cart_total, cart_last = _get_rows_summary(Cart.objects, "user")
+        following_total, following_last = _get_rows_summary(
+            Subscription.objects, "follower"
+        )
+        parts.append(
+            User.objects.filter(pk=user.pk).values_list(
+                "pk",
+                favorites_total,
+                favorites_last,
+                cart_total,
+                cart_last,
+                following_total,
+                following_last,
+            ).first()
+        )
+    return _make_etag(*parts, weak=True)
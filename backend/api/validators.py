@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from recipes.models import Tag, Ingredient
+from recipes.catalog import ingredient_ids, tag_ids
 from core.constants import MAX_AMOUNT_INGREDIENTS, MIN_AMOUNT_INGREDIENTS
 
 
@@ -39,10 +39,7 @@ def get_validated_tags(tags):
     if len(tags_id_list) != len(set(tags_id_list)):
         raise serializers.ValidationError("Теги должны быть уникальными!")
 
-    existing_tags = Tag.objects.filter(
-        id__in=tags_id_list
-    ).values_list("id", flat=True)
-    missing_tags = set(tags_id_list) - set(existing_tags)
+    missing_tags = tag_ids.get_missing(tags_id_list)
     if missing_tags:
         raise serializers.ValidationError(
             f"Тег(ов) с id {missing_tags} не существует!"
@@ -83,10 +80,7 @@ def get_validated_ingredients(ingredients):
             f"{MAX_AMOUNT_INGREDIENTS}"
         )
 
-    existing_ingredients = Ingredient.objects.filter(
-        id__in=ingredients_id_list
-    ).values_list("id", flat=True)
-    missing_ingredients = set(ingredients_id_list) - set(existing_ingredients)
+    missing_ingredients = ingredient_ids.get_missing(ingredients_id_list)
     if missing_ingredients:
         raise serializers.ValidationError(
             f"Ингредиент(ы) с id {missing_ingredients} не существуют!"
@@ -1,42 +1,114 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, F
+from django.db import IntegrityError
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    prefetch_related_objects,
+)
+from django.db.transaction import atomic
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from djoser.views import UserViewSet as DjoserUserViewSet
 
-from .filters import RecipeFilter, IngredientFilter
+from .changes import (
+    decode_changes_token,
+    is_changes_token_expired,
+    iter_changes,
+)
+from .exporters import (
+    EXPORT_FORMATS,
+    PDF_CONTENT_TYPE,
+    ExportContentNegotiation,
+    export_shopping_list,
+)
+from .filters import RecipeFilter
 from .serializers import (
-    AddToFavoriteSerializer,
     AvatarSerializer,
-    AddToCartSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     ShortRecipeSerializer,
     SubscriptionsSerializer,
     TagSerializer,
     IngredientSerializer,
 )
-from .paginators import CustomPaginatorWithLimit
+from .pdf_jobs import PdfRenderError, get_shopping_list_pdf
+from .paginators import CachedCountPaginator, RecipeCursorPaginator
 from .permissions import ReadOnlyOrIsAuthenticatedOrAuthor
 from .mixins import CustomDjoserPermissionsMethodsMixin
 from .validators import get_validated_id
-from .utils import generate_pdf
+from .writes import add_relation, remove_relation
+from .utils import (
+    add_recipes_to_collection,
+    delete_rows,
+    get_limited_recipes,
+    get_recipe_etag,
+    get_recipe_list_etag,
+    get_recipes_limit,
+    remove_recipes_from_collection,
+    update_counter,
+)
 from users.models import Subscription
-from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
-from core.constants import PDF_FILENAME, SHORT_LINK_URL_PATH
+from recipes.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.search import ingredient_index
+from recipes.shopping_list import (
+    add_recipe_to_shopping_list,
+    add_recipes_to_shopping_list,
+    get_shopping_list,
+    remove_recipe_from_shopping_list,
+    remove_recipes_from_shopping_list,
+)
+from recipes.utils import get_hashed_short_url
+from core.constants import (
+    MAX_CHANGES_PER_REQUEST,
+    SHOPPING_LIST_FILENAME,
+    SHORT_LINK_URL_PATH,
+)
 
 
 User = get_user_model()
 
+CATALOG_CHANGED_ERROR = (
+    "Теги или ингредиенты рецепта были удалены, обновите их и повторите "
+    "запрос."
+)
+
 
 class UserViewSet(CustomDjoserPermissionsMethodsMixin, DjoserUserViewSet):
     """Вьюсет получения/создания пользователей."""
 
-    pagination_class = CustomPaginatorWithLimit
+    pagination_class = CachedCountPaginator
+
+    def get_queryset(self):
+        """Добавляет к пользователям флаг подписки текущего пользователя."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(
+                    follower=user, following=OuterRef("pk")
+                )
+            )
+        )
 
     @action(
         detail=False,
@@ -70,18 +142,22 @@ class UserViewSet(CustomDjoserPermissionsMethodsMixin, DjoserUserViewSet):
     def subscribe(self, request, id=None):
         """Подписывает текущего пользователя на другого пользователя."""
         validated_id = get_validated_id(id, "users")
-        user_to_follow = get_object_or_404(User, pk=validated_id)
-        user = request.user
-        if user == user_to_follow:
+        if validated_id == request.user.id:
             return Response(
                 {"errors": "Нельзя подписаться на самого себя."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        _, created = Subscription.objects.get_or_create(
-            follower=user, following=user_to_follow
+        user_to_follow = add_relation(
+            Subscription,
+            "follower",
+            "following",
+            "followers_count",
+            request.user.id,
+            validated_id,
         )
-        if created:
+        if user_to_follow is None:
+            raise NotFound
+        if user_to_follow.added:
             serializer = SubscriptionsSerializer(
                 user_to_follow, context={"request": request}
             )
@@ -95,13 +171,17 @@ class UserViewSet(CustomDjoserPermissionsMethodsMixin, DjoserUserViewSet):
     def unsubscribe(self, request, id=None):
         """Отписывает текущего пользователя от другого пользователя."""
         validated_id = get_validated_id(id, "users")
-        user_to_unfollow = get_object_or_404(User, pk=validated_id)
-        user = request.user
-        subscription = Subscription.objects.filter(
-            follower=user, following=user_to_unfollow
-        ).first()
-        if subscription:
-            subscription.delete()
+        exists, removed = remove_relation(
+            Subscription,
+            "follower",
+            "following",
+            "followers_count",
+            request.user.id,
+            validated_id,
+        )
+        if not exists:
+            raise NotFound
+        if removed:
             return Response(
                 status=status.HTTP_204_NO_CONTENT,
             )
@@ -118,12 +198,22 @@ class UserViewSet(CustomDjoserPermissionsMethodsMixin, DjoserUserViewSet):
     def subscriptions(self, request):
         """Возвращает пользователей на которых подписан текущий юзер."""
         user = self.request.user
-        following_users = User.objects.filter(
-            follower_subscriptions__follower=user
+        following_users = (
+            User.objects.filter(follower_subscriptions__follower=user)
+            .annotate(subscribed_at=F("follower_subscriptions__created_at"))
+            .order_by("-subscribed_at", "-id")
         )
         pages = self.paginate_queryset(following_users)
+        recipes_by_author = get_limited_recipes(
+            [author.id for author in pages], get_recipes_limit(request)
+        )
         serializer = SubscriptionsSerializer(
-            pages, many=True, context={"request": request}
+            pages,
+            many=True,
+            context={
+                "request": request,
+                "recipes_by_author": recipes_by_author,
+            },
         )
         return self.get_paginated_response(serializer.data)
 
@@ -140,19 +230,162 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает ингредиенты по началу или части названия.
+
+        Ответ строится по индексу в памяти процесса без обращения к БД.
+        """
+        return Response(
+            ingredient_index.search(request.query_params.get("name", ""))
+        )
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет получения/добавления/удаления рецептов."""
 
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.select_related("author")
+    prefetch_lookups = (
+        "tags",
+        Prefetch(
+            "ingredient",
+            queryset=RecipeIngredient.objects.select_related(
+                "ingredient"
+            ).order_by("ingredient__name"),
+        ),
+    )
     serializer_class = RecipeSerializer
     permission_classes = (ReadOnlyOrIsAuthenticatedOrAuthor,)
-    pagination_class = CustomPaginatorWithLimit
+    pagination_class = CachedCountPaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    user_filter_params = ("is_favorited", "is_in_shopping_cart")
+
+    @property
+    def paginator(self):
+        """
+        Возвращает пагинатор для запроса.
+
+        По умолчанию используется постраничный пагинатор, курсорный
+        включается параметром "pagination=cursor" или наличием курсора.
+        """
+        if not hasattr(self, "_paginator"):
+            query_params = self.request.query_params
+            if (
+                query_params.get("pagination") == "cursor"
+                or RecipeCursorPaginator.cursor_query_param in query_params
+            ):
+                self._paginator = RecipeCursorPaginator()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Добавляет к рецептам флаги избранного и корзины пользователя.
+
+        Детальный просмотр подгружает теги и ингредиенты сам после проверки
+        ETag, а удалению они не нужны.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ("retrieve", "destroy"):
+            queryset = queryset.prefetch_related(*self.prefetch_lookups)
+        return self.annotate_user_flags(queryset)
+
+    def annotate_user_flags(self, queryset):
+        """
+        Добавляет к рецептам флаги текущего пользователя.
+
+        Избранное, корзина и подписка на автора проверяются подзапросами
+        EXISTS в том же запросе, что и рецепты.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    follower=user, following=OuterRef("author_id")
+                )
+            ),
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает список рецептов или 304, если он не изменился.
+
+        В курсорном режиме ETag не считается: клиент ленты получает
+        страницы по курсору и не повторяет запросы.
+        """
+        if isinstance(self.paginator, RecipeCursorPaginator):
+            return super().list(request, *args, **kwargs)
+        etag = get_recipe_list_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Возвращает рецепт или 304, если он не изменился.
+
+        Проверка ETag выполняется до загрузки тегов и ингредиентов
+        и до работы сериализатора.
+        """
+        recipe = self.get_object()
+        etag = get_recipe_etag(recipe)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            prefetch_related_objects([recipe], *self.prefetch_lookups)
+            serializer = self.get_serializer(recipe)
+            response = Response(serializer.data)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(recipe.updated_at.timestamp())
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def perform_create(self, serializer):
+        """
+        Создаёт рецепт и увеличивает счётчик рецептов автора.
+
+        Снимок id справочников в памяти процесса может не знать о только
+        что удалённом теге или ингредиенте. Тогда внешний ключ нарушается
+        при фиксации транзакции, и ошибка возвращается как 400.
+        """
+        try:
+            with atomic():
+                recipe = serializer.save()
+                update_counter(
+                    User.objects.filter(pk=recipe.author_id),
+                    "recipes_count",
+                    1,
+                )
+        except IntegrityError:
+            raise ValidationError({"errors": CATALOG_CHANGED_ERROR})
+
+    def perform_update(self, serializer):
+        """Обновляет рецепт, нарушение внешних ключей возвращается как 400."""
+        try:
+            with atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({"errors": CATALOG_CHANGED_ERROR})
+
+    @atomic
+    def perform_destroy(self, recipe):
+        update_counter(
+            User.objects.filter(pk=recipe.author_id), "recipes_count", -1
+        )
+        recipe.delete()
 
     def update(self, request, *args, **kwargs):
         if request.method == "PUT":
@@ -162,14 +395,59 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return super().update(request, *args, **kwargs)
 
+    @action(detail=False, url_path="changes")
+    def changes(self, request):
+        """
+        Возвращает ленту созданных, изменённых и удалённых рецептов.
+
+        Ответ передаётся потоком в формате NDJSON, по строке на изменение.
+        Последняя строка содержит токен, который передаётся в параметре
+        since следующего запроса. Если удаления после токена уже могли
+        быть стёрты, возвращается 410 и клиент синхронизируется заново.
+        """
+        token = request.query_params.get("since")
+        position = decode_changes_token(token)
+        if is_changes_token_expired(token, position):
+            return Response(
+                {"since": "Токен устарел, нужна полная синхронизация."},
+                status=status.HTTP_410_GONE,
+            )
+        try:
+            limit = int(
+                request.query_params.get("limit", MAX_CHANGES_PER_REQUEST)
+            )
+        except ValueError:
+            raise ValidationError({"limit": "Должно быть целым числом."})
+        limit = min(max(limit, 1), MAX_CHANGES_PER_REQUEST)
+        context = self.get_serializer_context()
+        return StreamingHttpResponse(
+            iter_changes(
+                self.annotate_user_flags(
+                    Recipe.objects.select_related("author")
+                ),
+                position,
+                limit,
+                lambda recipe: RecipeSerializer(recipe, context=context).data,
+                self.prefetch_lookups,
+            ),
+            content_type="application/x-ndjson",
+        )
+
     @action(detail=True, url_path="get-link")
     def get_short_link(self, request, pk=None):
         """Формирует короткую ссылку на рецепт."""
         validated_id = get_validated_id(pk, "recipes")
-        recipe = get_object_or_404(Recipe, pk=validated_id)
-        short_url = recipe.short_url
+        short_code = get_object_or_404(
+            Recipe.objects.values_list("short_code", flat=True),
+            pk=validated_id,
+        )
+        if short_code is None:
+            short_code = get_hashed_short_url(validated_id)
+            Recipe.objects.filter(pk=validated_id).update(
+                short_code=short_code
+            )
         url = request.build_absolute_uri(
-            f"/{SHORT_LINK_URL_PATH}/{short_url}/"
+            f"/{SHORT_LINK_URL_PATH}/{short_code}/"
         )
         return Response(
             {"short-link": url},
@@ -180,21 +458,61 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         url_path="download_shopping_cart",
         permission_classes=(IsAuthenticated,),
+        content_negotiation_class=ExportContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        """Возвращает список покупок в формате PDF."""
-        user = request.user
-        ingredients = (
-            Ingredient.objects.filter(recipe__recipe__in_carts__user=user)
-            .values("name", measurement=F("measurement_unit"))
-            .annotate(amount=Sum("recipe__amount"))
+        """
+        Возвращает список покупок файлом по частям.
+
+        Формат выбирается параметром format: pdf (по умолчанию), txt, csv
+        или json. Pdf рисуется в пуле процессов и кешируется на диске;
+        если он не готов за отведённое время, возвращается 202 с адресом
+        для повторного запроса.
+        """
+        export_format = request.query_params.get("format", "pdf")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {
+                    "format": "Доступные форматы: "
+                    f"{', '.join(EXPORT_FORMATS)}."
+                }
+            )
+        if export_format == "pdf":
+            try:
+                pdf_file = get_shopping_list_pdf(
+                    get_shopping_list(request.user.id)
+                )
+            except PdfRenderError:
+                return Response(
+                    {
+                        "errors": "Не удалось сформировать pdf, повторите "
+                        "запрос позже или выберите другой формат."
+                    },
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            if pdf_file is None:
+                url = request.build_absolute_uri()
+                return Response(
+                    {
+                        "detail": "Список покупок готовится, "
+                        "повторите запрос позже.",
+                        "url": url,
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Location": url, "Retry-After": "1"},
+                )
+            return FileResponse(
+                pdf_file,
+                as_attachment=True,
+                filename=f"{SHOPPING_LIST_FILENAME}.pdf",
+                content_type=PDF_CONTENT_TYPE,
+            )
+        content_type, chunks = export_shopping_list(
+            get_shopping_list(request.user.id).iterator(), export_format
         )
-
-        pdf_buffer = generate_pdf(ingredients)
-
-        response = HttpResponse(pdf_buffer, content_type="application/pdf")
+        response = StreamingHttpResponse(chunks, content_type=content_type)
         response["Content-Disposition"] = (
-            f"attachment; filename={PDF_FILENAME}"
+            f"attachment; filename={SHOPPING_LIST_FILENAME}.{export_format}"
         )
         return response
 
@@ -204,17 +522,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=("post",),
         permission_classes=(IsAuthenticated,),
     )
+    @atomic
     def shopping_cart(self, request, pk=None):
         """Добавляет рецепт в список покупок."""
         validated_id = get_validated_id(pk, "recipes")
-        user_id = request.user.id
-        recipe = get_object_or_404(Recipe, pk=validated_id)
-        data = {"user": user_id, "recipe": recipe.pk}
-        serializer = AddToCartSerializer(
-            data=data, context={"request": request}
+        recipe = add_relation(
+            Cart, "user", "recipe", "in_carts_count",
+            request.user.id, validated_id,
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if recipe is None:
+            raise NotFound
+        if not recipe.added:
+            return Response(
+                {"errors": "Рецепт уже в списке покупок."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        add_recipe_to_shopping_list(request.user.id, recipe.pk)
 
         recipe_serializer = ShortRecipeSerializer(
             recipe, context={"request": request}
@@ -222,15 +545,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(recipe_serializer.data, status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
+    @atomic
     def delete_recipe_from_shopping_cart(self, request, pk=None):
         """Удаляет рецепт из списка покупок."""
         validated_id = get_validated_id(pk, "recipes")
-        recipe = get_object_or_404(Recipe, pk=validated_id)
-        on_cart_recipe = Cart.objects.filter(
-            user=request.user, recipe=recipe
-        ).first()
-        if on_cart_recipe:
-            on_cart_recipe.delete()
+        exists, removed = remove_relation(
+            Cart, "user", "recipe", "in_carts_count",
+            request.user.id, validated_id,
+        )
+        if not exists:
+            raise NotFound
+        if removed:
+            remove_recipe_from_shopping_list(request.user.id, validated_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Этого рецепта нет в списке покупок."},
@@ -246,14 +572,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk=None):
         """Добавляет рецепт в список избранного."""
         validated_id = get_validated_id(pk, "recipes")
-        user_id = request.user.id
-        recipe = get_object_or_404(Recipe, pk=validated_id)
-        data = {"user": user_id, "recipe": recipe.pk}
-        serializer = AddToFavoriteSerializer(
-            data=data, context={"request": request}
+        recipe = add_relation(
+            Favorite, "user", "recipe", "favorites_count",
+            request.user.id, validated_id,
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if recipe is None:
+            raise NotFound
+        if not recipe.added:
+            return Response(
+                {"errors": "Рецепт уже в списке избранного."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         recipe_serializer = ShortRecipeSerializer(
             recipe, context={"request": request}
@@ -264,14 +593,121 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def delete_recipe_from_favorite(self, request, pk=None):
         """Удаляет рецепт из списка избранного."""
         validated_id = get_validated_id(pk, "recipes")
-        recipe = get_object_or_404(Recipe, pk=validated_id)
-        favorite_recipe = Favorite.objects.filter(
-            user=request.user, recipe=recipe
-        ).first()
-        if favorite_recipe:
-            favorite_recipe.delete()
+        exists, removed = remove_relation(
+            Favorite, "user", "recipe", "favorites_count",
+            request.user.id, validated_id,
+        )
+        if not exists:
+            raise NotFound
+        if removed:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Этого рецепта нет в списке избранного."},
             status=status.HTTP_400_BAD_REQUEST,
         )
+
+    @staticmethod
+    def get_batch_ids(request):
+        """Возвращает проверенный список id рецептов из тела запроса."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["recipes"]
+
+    @staticmethod
+    def get_batch_response(statuses):
+        """Возвращает результат пакетной операции по каждому id."""
+        return Response(
+            {
+                "results": [
+                    {"id": pk, "status": recipe_status}
+                    for pk, recipe_status in statuses.items()
+                ]
+            }
+        )
+
+    @action(
+        detail=False,
+        url_path="shopping_cart",
+        url_name="shopping-cart-batch",
+        methods=("post",),
+        permission_classes=(IsAuthenticated,),
+    )
+    @atomic
+    def shopping_cart_batch(self, request):
+        """Добавляет несколько рецептов в список покупок."""
+        statuses, added = add_recipes_to_collection(
+            Cart,
+            "in_carts_count",
+            request.user.id,
+            self.get_batch_ids(request),
+        )
+        add_recipes_to_shopping_list(request.user.id, added)
+        return self.get_batch_response(statuses)
+
+    @shopping_cart_batch.mapping.delete
+    @atomic
+    def delete_recipes_from_shopping_cart(self, request):
+        """Удаляет несколько рецептов из списка покупок."""
+        statuses, removed = remove_recipes_from_collection(
+            Cart,
+            "in_carts_count",
+            request.user.id,
+            self.get_batch_ids(request),
+        )
+        remove_recipes_from_shopping_list(request.user.id, removed)
+        return self.get_batch_response(statuses)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart/clear",
+        url_name="shopping-cart-clear",
+        methods=("delete",),
+        permission_classes=(IsAuthenticated,),
+    )
+    @atomic
+    def clear_shopping_cart(self, request):
+        """
+        Очищает список покупок.
+
+        Корзина и сохранённый список покупок удаляются каждый одним DELETE,
+        затем счётчики удалённых из корзины рецептов уменьшаются одним
+        UPDATE.
+        """
+        removed = delete_rows(
+            Cart.objects.filter(user_id=request.user.id), "recipe_id"
+        )
+        update_counter(
+            Recipe.objects.filter(pk__in=removed), "in_carts_count", -1
+        )
+        delete_rows(ShoppingListItem.objects.filter(user_id=request.user.id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        url_path="favorite",
+        url_name="favorite-batch",
+        methods=("post",),
+        permission_classes=(IsAuthenticated,),
+    )
+    @atomic
+    def favorite_batch(self, request):
+        """Добавляет несколько рецептов в избранное."""
+        statuses, _ = add_recipes_to_collection(
+            Favorite,
+            "favorites_count",
+            request.user.id,
+            self.get_batch_ids(request),
+        )
+        return self.get_batch_response(statuses)
+
+    @favorite_batch.mapping.delete
+    @atomic
+    def delete_recipes_from_favorite(self, request):
+        """Удаляет несколько рецептов из избранного."""
+        statuses, _ = remove_recipes_from_collection(
+            Favorite,
+            "favorites_count",
+            request.user.id,
+            self.get_batch_ids(request),
+        )
+        return self.get_batch_response(statuses)
@@ -0,0 +1,153 @@
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .utils import update_counter
+
+
+def _get_columns(model, owner_field, target_field):
+    """Возвращает таблицы и столбцы связи и связываемой модели."""
+    target = model._meta.get_field(target_field)
+    target_model = target.related_model
+    return (
+        model._meta.db_table,
+        model._meta.get_field(owner_field).column,
+        target.column,
+        target_model,
+        target_model._meta.db_table,
+        target_model._meta.pk.column,
+    )
+
+
+def _get_insert_values(model, owner_field, target_field, owner_id, target_id):
+    """Возвращает столбцы и значения новой строки с учётом умолчаний."""
+    row = model(
+        **{f"{owner_field}_id": owner_id, f"{target_field}_id": target_id}
+    )
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    return (
+        [field.column for field in fields],
+        [
+            field.get_db_prep_save(field.pre_save(row, True), connection)
+            for field in fields
+        ],
+    )
+
+
+def add_relation(
+    model, owner_field, target_field, counter, owner_id, target_id
+):
+    """
+    Создаёт связь пользователя с рецептом или автором.
+
+    Возвращает связываемый объект с атрибутом added или None, если его
+    нет. В PostgreSQL проверка существования объекта, вставка связи с
+    ON CONFLICT DO NOTHING и увеличение счётчика выполняются одним
+    запросом. Вставка идёт через SELECT из существующего объекта, поэтому
+    нарушения внешнего ключа не возникает.
+    """
+    (
+        table, owner_column, target_column,
+        target_model, target_table, target_pk,
+    ) = _get_columns(model, owner_field, target_field)
+    if connection.vendor != "postgresql":
+        target = target_model.objects.filter(pk=target_id).first()
+        if target is None:
+            return None
+        _, target.added = model.objects.get_or_create(
+            **{f"{owner_field}_id": owner_id, f"{target_field}_id": target_id}
+        )
+        if target.added:
+            update_counter(
+                target_model.objects.filter(pk=target_id), counter, 1
+            )
+        return target
+    columns, values = _get_insert_values(
+        model, owner_field, target_field, owner_id, target_id
+    )
+    selected = ", ".join(
+        f"target.{target_pk}" if column == target_column else "%s"
+        for column in columns
+    )
+    targets = target_model.objects.raw(
+        f"WITH target AS (SELECT * FROM {target_table} "
+        f"WHERE {target_pk} = %s), "
+        f"inserted AS (INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {selected} FROM target "
+        f"ON CONFLICT DO NOTHING RETURNING {target_column}), "
+        f"counted AS (UPDATE {target_table} SET {counter} = {counter} + 1 "
+        f"WHERE {target_pk} IN (SELECT {target_column} FROM inserted) "
+        f"RETURNING {target_pk}) "
+        "SELECT target.*, EXISTS (SELECT 1 FROM counted) AS added "
+        "FROM target",
+        [
+            target_id,
+            *(
+                value
+                for column, value in zip(columns, values)
+                if column != target_column
+            ),
+        ],
+    )
+    return next(iter(targets), None)
+
+
+def remove_relation(
+    model, owner_field, target_field, counter, owner_id, target_id
+):
+    """
+    Удаляет связь пользователя с рецептом или автором.
+
+    Возвращает пару (объект существует, связь удалена). В PostgreSQL
+    удаление с RETURNING, уменьшение счётчика и проверка существования
+    объекта выполняются одним запросом.
+    """
+    (
+        table, owner_column, target_column,
+        target_model, target_table, target_pk,
+    ) = _get_columns(model, owner_field, target_field)
+    if connection.vendor != "postgresql":
+        exists, related = (
+            target_model.objects.filter(pk=target_id)
+            .annotate(
+                related=Exists(
+                    model.objects.filter(
+                        **{
+                            f"{owner_field}_id": owner_id,
+                            target_field: OuterRef("pk"),
+                        }
+                    )
+                )
+            )
+            .values_list("pk", "related")
+            .first()
+            or (False, False)
+        )
+        if related:
+            model.objects.filter(
+                **{
+                    f"{owner_field}_id": owner_id,
+                    f"{target_field}_id": target_id,
+                }
+            ).delete()
+            update_counter(
+                target_model.objects.filter(pk=target_id), counter, -1
+            )
+        return bool(exists), related
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH deleted AS (DELETE FROM {table} "
+            f"WHERE {owner_column} = %s AND {target_column} = %s "
+            f"RETURNING {target_column}), "
+            f"counted AS (UPDATE {target_table} "
+            f"SET {counter} = GREATEST({counter} - 1, 0) "
+            f"WHERE {target_pk} IN (SELECT {target_column} FROM deleted) "
+            f"RETURNING {target_pk}) "
+            f"SELECT EXISTS (SELECT 1 FROM {target_table} "
+            f"WHERE {target_pk} = %s), EXISTS (SELECT 1 FROM counted)",
+            (owner_id, target_id, target_id),
+        )
+        return cursor.fetchone()
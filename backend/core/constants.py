@@ -13,14 +13,29 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 720
 
 OBJ_PER_PAGE = 10
+MAX_OBJ_PER_PAGE = 100
+LIST_CACHE_VERSION_KEY = "list-cache-version"
+LIST_CACHE_TTL = 60
+COUNT_ESTIMATE_THRESHOLD = 100000
 INGREDIENTS_PER_PAGE = 20
+MAX_RECIPES_LIMIT = 50
+MAX_BATCH_RECIPES = 100
+INGREDIENTS_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+CATALOG_VERSION_KEY = "catalog-version"
+CATALOG_IDS_TTL = 300
 
 SHORT_LINK_URL_PATH = "s"
+MAX_SHORT_CODE_LENGTH = 16
+SHORT_CODE_CACHE_SIZE = 10000
+SHORT_CODE_CACHE_TTL = 300
+SHORT_LINK_MAX_AGE = 3600
 
 MIN_LENGTH_FOR_SHORT_URL = 3
 SALT = "mysecret"
 
-PDF_FILENAME = "spisok_pokupok.pdf"
+SHOPPING_LIST_FILENAME = "spisok_pokupok"
+EXPORT_CHUNK_SIZE = 64 * 1024
 
 FONT_SIZE_HEADER = 16
 FONT_SIZE_INGREDIENTS = 10
@@ -28,3 +43,36 @@ INDENT_TOP_REGULAR = 40
 INDENT_LEFT_REGULAR = 30
 INDENT_AFTER_HEADER = 30
 INDENT_BETWEEN_INGREDIENTS = 20
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_TIMEOUT = 2
+PDF_RENDER_LOCK_TTL = 60
+
+IMAGE_VARIANT_FORMATS = {"webp": "webp", "jpeg": "jpg"}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2
+RECIPE_IMAGE_SIZES = {"thumb": (320, 320), "detail": (960, 960)}
+AVATAR_SIZES = {"small": (64, 64), "medium": (160, 160)}
+
+CHANGES_CHUNK_SIZE = 500
+MAX_CHANGES_PER_REQUEST = 10000
+CHANGES_SAFETY_LAG = 5
+RECIPE_DELETION_RETENTION_DAYS = 30
+
+SERVER_TIMING_HEADER = "HTTP_X_SERVER_TIMING"
+
+PROFILE_REQUEST_HEADER = "HTTP_X_PROFILE"
+PROFILE_QUERY_PARAM = "_profile"
+PROFILES_MAX_COUNT = 50
+PROFILE_COLLAPSED_MAX_DEPTH = 64
+PROFILE_COLLAPSED_MIN_TIME = 0.0001
+
+METRICS_PREFIX = "foodgram"
+METRICS_FILE_INITIAL_SIZE = 64 * 1024
+METRICS_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+METRICS_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+METRICS_SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304
+)
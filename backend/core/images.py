@@ -0,0 +1,152 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .constants import (
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WORKERS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants"
+)
+
+
+def get_variant_name(name, size, extension):
+    """Возвращает имя файла уменьшенной копии изображения в хранилище."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f"{directory}/variants/{stem}/{size}.{extension}"
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == "jpeg" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background.paste(image, mask=image.getchannel("A"))
+        else:
+            background.paste(image.convert("RGB"))
+        image = background
+    image.save(
+        buffer,
+        format=image_format.upper(),
+        quality=IMAGE_VARIANT_QUALITY,
+        optimize=True,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def build_image_variants(name, sizes):
+    """
+    Создаёт уменьшенные копии изображения во всех форматах.
+
+    Возвращает словарь с именем исходного файла и именами копий по
+    размерам и форматам. Не обращается к базе данных, поэтому может
+    выполняться в отдельном процессе.
+    """
+    with default_storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    variants = {}
+    for size, dimensions in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(dimensions, Image.LANCZOS)
+        variants[size] = {}
+        for image_format, extension in IMAGE_VARIANT_FORMATS.items():
+            variant_name = get_variant_name(name, size, extension)
+            default_storage.delete(variant_name)
+            variants[size][image_format] = default_storage.save(
+                variant_name, _encode(resized, image_format)
+            )
+    return {"source": name, "sizes": variants}
+
+
+def delete_image_variants(variants):
+    """Удаляет файлы уменьшенных копий из хранилища."""
+    for formats in variants.get("sizes", {}).values():
+        for variant_name in formats.values():
+            default_storage.delete(variant_name)
+
+
+def save_image_variants(
+    model, pk, field, variants_field, sizes, update_fields=()
+):
+    """
+    Создаёт копии текущего изображения объекта и сохраняет их имена.
+
+    Если за время обработки изображение заменили, результат отбрасывается.
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    name = getattr(instance, field).name
+    old_variants = getattr(instance, variants_field)
+    if not name or old_variants.get("source") == name:
+        return
+    variants = build_image_variants(name, sizes)
+    if not model.objects.filter(pk=pk, **{field: name}).exists():
+        delete_image_variants(variants)
+        return
+    setattr(instance, variants_field, variants)
+    instance.save(update_fields=(variants_field, *update_fields))
+    delete_image_variants(old_variants)
+
+
+def _run_in_background(function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+    except Exception:
+        logger.exception("Не удалось обработать изображение")
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(
+    instance, field, variants_field, sizes, update_fields=()
+):
+    """
+    Ставит создание копий изображения объекта в фоновый поток.
+
+    Задача запускается после фиксации транзакции и только если изображение
+    изменилось с момента прошлой обработки. Если изображение удалено,
+    копии удаляются, а их список очищается.
+    """
+    name = getattr(instance, field).name
+    variants = getattr(instance, variants_field)
+    if variants.get("source") == name or (not name and not variants):
+        return
+    if not name:
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{variants_field: {}}
+        )
+        setattr(instance, variants_field, {})
+        transaction.on_commit(
+            lambda: _executor.submit(
+                _run_in_background, delete_image_variants, variants
+            )
+        )
+        return
+    transaction.on_commit(
+        lambda: _executor.submit(
+            _run_in_background,
+            save_image_variants,
+            type(instance),
+            instance.pk,
+            field,
+            variants_field,
+            sizes,
+            update_fields,
+        )
+    )
@@ -0,0 +1,330 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+
+from .constants import (
+    METRICS_FILE_INITIAL_SIZE,
+    METRICS_LATENCY_BUCKETS,
+    METRICS_PREFIX,
+    METRICS_QUERY_BUCKETS,
+    METRICS_SIZE_BUCKETS,
+)
+
+
+HEADER = struct.Struct("q")
+LENGTH = struct.Struct("i")
+VALUE = struct.Struct("d")
+
+METRICS = {
+    "http_requests_total": ("counter", "Количество запросов."),
+    "http_requests_in_flight": (
+        "gauge",
+        "Количество запросов, которые обрабатываются сейчас.",
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Время обработки запроса в секундах.",
+    ),
+    "http_request_queries": (
+        "histogram",
+        "Количество SQL-запросов на один запрос.",
+    ),
+    "http_response_size_bytes": ("histogram", "Размер ответа в байтах."),
+}
+
+HISTOGRAM_BUCKETS = {
+    "http_request_duration_seconds": METRICS_LATENCY_BUCKETS,
+    "http_request_queries": METRICS_QUERY_BUCKETS,
+    "http_response_size_bytes": METRICS_SIZE_BUCKETS,
+}
+
+ROUTE_PREFIXES = ("api:", "short_url")
+
+
+def _get_entry_size(key_length):
+    """Возвращает размер записи с выравниванием значения по 8 байт."""
+    size = LENGTH.size + key_length
+    return size + (-size) % 8 + VALUE.size
+
+
+def _is_gauge(name):
+    return METRICS.get(name, ("",))[0] == "gauge"
+
+
+def read_entries(data):
+    """Возвращает пары (ключ, значение) из содержимого файла метрик."""
+    used = HEADER.unpack_from(data, 0)[0]
+    position = HEADER.size
+    while position < used:
+        key_length = LENGTH.unpack_from(data, position)[0]
+        key_start = position + LENGTH.size
+        key = bytes(data[key_start:key_start + key_length]).decode()
+        position += _get_entry_size(key_length)
+        yield key, VALUE.unpack_from(data, position - VALUE.size)[0], (
+            position - VALUE.size
+        )
+
+
+class MetricsFile:
+    """
+    Значения метрик одного процесса в файле, отображённом в память.
+
+    Файл начинается с размера занятой части, за ним идут записи из длины
+    ключа, ключа и значения double. Новая запись сначала пишется целиком,
+    и только потом увеличивается размер занятой части, поэтому процесс,
+    который читает файл одновременно с записью, видит только готовые
+    записи. Если файл остался от завершившегося процесса с тем же pid,
+    его счётчики продолжают накапливаться, а значения gauge обнуляются.
+    """
+
+    def __init__(self, path):
+        self._lock = Lock()
+        self._file = open(path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < METRICS_FILE_INITIAL_SIZE:
+            self._file.truncate(METRICS_FILE_INITIAL_SIZE)
+            size = METRICS_FILE_INITIAL_SIZE
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._used = HEADER.unpack_from(self._mmap, 0)[0]
+        if not self._used:
+            self._used = HEADER.size
+            HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions = {}
+        for key, _, position in read_entries(self._mmap):
+            self._positions[key] = position
+            if _is_gauge(json.loads(key)[0]):
+                VALUE.pack_into(self._mmap, position, 0.0)
+
+    def _add(self, key):
+        encoded = key.encode()
+        entry_size = _get_entry_size(len(encoded))
+        if self._used + entry_size > len(self._mmap):
+            size = len(self._mmap)
+            while self._used + entry_size > size:
+                size *= 2
+            self._mmap.close()
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+        LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        start = self._used + LENGTH.size
+        self._mmap[start:start + len(encoded)] = encoded
+        position = self._used + entry_size - VALUE.size
+        VALUE.pack_into(self._mmap, position, 0.0)
+        self._used += entry_size
+        HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def increment(self, key, amount=1):
+        """Увеличивает значение по ключу на amount."""
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            value = VALUE.unpack_from(self._mmap, position)[0]
+            VALUE.pack_into(self._mmap, position, value + amount)
+
+
+_lock = Lock()
+_store = None
+
+
+def is_enabled():
+    return bool(settings.METRICS_DIR)
+
+
+def get_store():
+    """
+    Возвращает файл метрик текущего процесса.
+
+    После fork воркер gunicorn открывает собственный файл, имя которого
+    содержит его pid.
+    """
+    global _store
+    owner = (os.getpid(), settings.METRICS_DIR)
+    if _store is None or _store[0] != owner:
+        with _lock:
+            if _store is None or _store[0] != owner:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                _store = (
+                    owner,
+                    MetricsFile(
+                        os.path.join(settings.METRICS_DIR, f"{owner[0]}.db")
+                    ),
+                )
+    return _store[1]
+
+
+def clear_metrics_dir():
+    """
+    Удаляет файлы метрик процессов прошлого запуска.
+
+    Вызывается до запуска воркеров, иначе новый воркер с совпавшим pid
+    продолжил бы чужие значения.
+    """
+    if not is_enabled():
+        return
+    try:
+        entries = os.scandir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.name.endswith(".db"):
+                os.remove(entry.path)
+
+
+def _make_key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def increment(name, labels, amount=1):
+    get_store().increment(_make_key(name, labels), amount)
+
+
+def observe(name, labels, value):
+    """Добавляет значение в гистограмму."""
+    buckets = HISTOGRAM_BUCKETS[name]
+    index = bisect_left(buckets, value)
+    bucket = str(buckets[index]) if index < len(buckets) else "+Inf"
+    store = get_store()
+    store.increment(_make_key(f"{name}_bucket", {**labels, "le": bucket}))
+    store.increment(_make_key(f"{name}_sum", labels), value)
+    store.increment(_make_key(f"{name}_count", labels))
+
+
+def get_route(request):
+    """Возвращает имя маршрута для меток или None для прочих адресов."""
+    match = request.resolver_match
+    if match is None or not match.view_name.startswith(ROUTE_PREFIXES):
+        return None
+    return match.view_name
+
+
+def observe_request(request, response, duration, queries):
+    """Записывает метрики обработанного запроса."""
+    route = get_route(request)
+    if route is None:
+        return
+    labels = {"route": route, "method": request.method}
+    increment(
+        "http_requests_total",
+        {**labels, "status": str(response.status_code)},
+    )
+    observe("http_request_duration_seconds", labels, duration)
+    observe("http_request_queries", labels, queries)
+    if response.streaming:
+        size = response.get("Content-Length")
+    else:
+        size = len(response.content)
+    if size is not None:
+        observe("http_response_size_bytes", labels, int(size))
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """
+    Суммирует метрики из файлов всех процессов.
+
+    Счётчики и гистограммы завершившихся процессов продолжают
+    учитываться, чтобы значения не уменьшались. Текущее число запросов
+    берётся только у живых процессов.
+    """
+    values = defaultdict(float)
+    with os.scandir(settings.METRICS_DIR) as entries:
+        for entry in entries:
+            pid, extension = os.path.splitext(entry.name)
+            if extension != ".db" or not pid.isdigit():
+                continue
+            alive = None
+            with open(entry.path, "rb") as file:
+                data = file.read()
+            if len(data) < HEADER.size:
+                continue
+            for key, value, _ in read_entries(data):
+                name, labels = json.loads(key)
+                if _is_gauge(name):
+                    if alive is None:
+                        alive = _is_alive(int(pid))
+                    if not alive:
+                        continue
+                values[(name, tuple(map(tuple, labels)))] += value
+    return values
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_metrics():
+    """Возвращает метрики всех процессов в текстовом формате Prometheus."""
+    values = collect()
+    by_name = defaultdict(list)
+    for (name, labels), value in values.items():
+        by_name[name].append((labels, value))
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        full_name = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        if metric_type != "histogram":
+            for labels, value in sorted(by_name[name]):
+                lines.append(
+                    f"{full_name}{_format_labels(labels)} "
+                    f"{_format_value(value)}"
+                )
+            continue
+        buckets = defaultdict(dict)
+        for labels, value in by_name[f"{name}_bucket"]:
+            labels = dict(labels)
+            bucket = labels.pop("le")
+            buckets[tuple(sorted(labels.items()))][bucket] = value
+        sums = dict(by_name[f"{name}_sum"])
+        for labels, count in sorted(by_name[f"{name}_count"]):
+            cumulative = 0
+            for bucket in HISTOGRAM_BUCKETS[name]:
+                cumulative += buckets[labels].get(str(bucket), 0)
+                lines.append(
+                    f"{full_name}_bucket"
+                    f"{_format_labels(labels + (('le', str(bucket)),))} "
+                    f"{_format_value(cumulative)}"
+                )
+            lines.append(
+                f"{full_name}_bucket"
+                f"{_format_labels(labels + (('le', '+Inf'),))} "
+                f"{_format_value(count)}"
+            )
+            lines.append(
+                f"{full_name}_sum{_format_labels(labels)} "
+                f"{_format_value(sums.get(labels, 0))}"
+            )
+            lines.append(
+                f"{full_name}_count{_format_labels(labels)} "
+                f"{_format_value(count)}"
+            )
+    return "\n".join(lines) + "\n"
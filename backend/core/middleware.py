@@ -0,0 +1,207 @@
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics
+from .constants import (
+    PROFILE_QUERY_PARAM,
+    PROFILE_REQUEST_HEADER,
+    SERVER_TIMING_HEADER,
+)
+from .profiling import profile_request
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimer:
+    """
+    Счётчик SQL-запросов и времени обработки одного запроса.
+
+    Передаётся в connection.execute_wrapper и считает число запросов и их
+    суммарное время. Отметки начала view и отрисовки ответа ставит
+    middleware.
+    """
+
+    __slots__ = (
+        "queries",
+        "db_time",
+        "view_started",
+        "view_db_started",
+        "render_started",
+        "render_db_started",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_db_started = 0.0
+        self.render_started = None
+        self.render_db_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+
+    def get_timings(self, finished, total):
+        """
+        Возвращает длительности этапов запроса в миллисекундах.
+
+        app - работа view и сериализаторов без SQL, render - отрисовка
+        ответа DRF.
+        """
+        timings = {"db": self.db_time * 1000}
+        if self.view_started is not None:
+            if self.render_started is None:
+                view_time = finished - self.view_started
+                view_db_time = self.db_time - self.view_db_started
+            else:
+                view_time = self.render_started - self.view_started
+                view_db_time = self.render_db_started - self.view_db_started
+            timings["app"] = max(view_time - view_db_time, 0) * 1000
+        if self.render_started is not None:
+            timings["render"] = (finished - self.render_started) * 1000
+        timings["total"] = total * 1000
+        return timings
+
+    def get_header(self, timings):
+        """Собирает значение заголовка Server-Timing."""
+        return ", ".join(
+            f'{name};dur={duration:.1f};desc="{self.queries} queries"'
+            if name == "db"
+            else f"{name};dur={duration:.1f}"
+            for name, duration in timings.items()
+        )
+
+
+class ServerTimingMiddleware:
+    """
+    Считает SQL-запросы и время обработки запроса.
+
+    Заголовок Server-Timing добавляется ко всем ответам, если включена
+    настройка SERVER_TIMING, или по заголовку запроса X-Server-Timing
+    от сотрудника. Запросы, превысившие SLOW_REQUEST_QUERIES запросов к
+    базе или SLOW_REQUEST_MS миллисекунд, пишутся в лог с именем view.
+    Если включены метрики, результаты замеров записываются в них.
+    Если ничего из этого не включено, запрос не замеряется. Запросы,
+    выполненные при отдаче потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.always = settings.SERVER_TIMING
+        self.max_queries = settings.SLOW_REQUEST_QUERIES
+        self.max_ms = settings.SLOW_REQUEST_MS
+        self.collect_metrics = metrics.is_enabled()
+        self.measure_all = any(
+            (self.always, self.max_queries, self.max_ms, self.collect_metrics)
+        )
+
+    def __call__(self, request):
+        requested = SERVER_TIMING_HEADER in request.META
+        if not (self.measure_all or requested):
+            return self.get_response(request)
+        timer = request.server_timer = RequestTimer()
+        if self.collect_metrics:
+            metrics.increment("http_requests_in_flight", {})
+        started = perf_counter()
+        try:
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+        finally:
+            if self.collect_metrics:
+                metrics.increment("http_requests_in_flight", {}, -1)
+        finished = perf_counter()
+        timings = timer.get_timings(finished, finished - started)
+        if self.always or (requested and self.is_staff(request)):
+            response["Server-Timing"] = timer.get_header(timings)
+        self.log_slow_request(request, timer, timings)
+        if self.collect_metrics:
+            metrics.observe_request(
+                request, response, finished - started, timer.queries
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timer = getattr(request, "server_timer", None)
+        if timer is not None:
+            timer.view_started = perf_counter()
+            timer.view_db_started = timer.db_time
+
+    def process_template_response(self, request, response):
+        timer = getattr(request, "server_timer", None)
+        if timer is not None:
+            timer.render_started = perf_counter()
+            timer.render_db_started = timer.db_time
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        """
+        Проверяет, что запрос сделал сотрудник.
+
+        DRF записывает пользователя, найденного по токену, в исходный
+        запрос, поэтому проверка выполняется после view.
+        """
+        user = getattr(request, "user", None)
+        return bool(user is not None and user.is_staff)
+
+    def log_slow_request(self, request, timer, timings):
+        if not (
+            (self.max_queries and timer.queries > self.max_queries)
+            or (self.max_ms and timings["total"] > self.max_ms)
+        ):
+            return
+        match = request.resolver_match
+        logger.warning(
+            "Медленный запрос %s %s (%s): %.1f мс, SQL %d запросов за %.1f мс",
+            request.method,
+            request.path,
+            match.view_name if match else "-",
+            timings["total"],
+            timer.queries,
+            timings["db"],
+        )
+
+
+class ProfilerMiddleware:
+    """
+    Выполняет запрос сотрудника под cProfile по заголовку X-Profile или
+    параметру _profile в адресе.
+
+    Пользователь определяется до view по сессии или токену, поэтому флаг
+    от остальных пользователей игнорируется без затрат на профилирование.
+    Профили сохраняются в PROFILES_DIR, их список и отчёты выводит
+    команда profiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            PROFILE_REQUEST_HEADER in request.META
+            or PROFILE_QUERY_PARAM in request.GET
+        ) and self.is_staff(request):
+            return profile_request(self.get_response, request)
+        return self.get_response(request)
+
+    @staticmethod
+    def is_staff(request):
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                return False
+            user = result[0] if result else None
+        return bool(user is not None and user.is_staff)
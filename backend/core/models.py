@@ -0,0 +1,27 @@
+class ProtectedFieldsMixin:
+    """
+    Не даёт полному сохранению объекта перезаписать защищённые поля.
+
+    Счётчики и списки уменьшенных копий изображений меняются отдельными
+    UPDATE, и значения в памяти объекта могут устареть. Поэтому
+    существующий объект без update_fields сохраняется со всеми
+    загруженными полями, кроме protected_fields.
+    """
+
+    protected_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.protected_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
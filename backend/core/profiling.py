@@ -0,0 +1,178 @@
+import cProfile
+import os
+import pstats
+import re
+import uuid
+from io import StringIO
+
+from django.conf import settings
+from django.utils import timezone
+
+from .constants import (
+    PROFILE_COLLAPSED_MAX_DEPTH,
+    PROFILE_COLLAPSED_MIN_TIME,
+    PROFILES_MAX_COUNT,
+)
+
+
+PROFILE_EXTENSION = ".prof"
+COLLAPSED_EXTENSION = ".collapsed"
+
+
+def get_profile_path(name, extension=PROFILE_EXTENSION):
+    """Возвращает путь к файлу профиля по его имени."""
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise ValueError(f"Некорректное имя профиля: {name}")
+    return os.path.join(settings.PROFILES_DIR, f"{name}{extension}")
+
+
+def make_profile_name(request):
+    """Собирает имя профиля из времени, метода и маршрута запроса."""
+    match = request.resolver_match
+    route = match.view_name if match else request.path
+    return "-".join(
+        (
+            timezone.now().strftime("%Y%m%dT%H%M%S"),
+            request.method.lower(),
+            re.sub(r"[^\w.-]+", "_", route).strip("_")[:64],
+            uuid.uuid4().hex[:6],
+        )
+    )
+
+
+def _format_function(function):
+    filename, line, name = function
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}:{name}"
+
+
+def get_collapsed_stacks(stats):
+    """
+    Возвращает стеки вызовов в свёрнутом формате для flamegraph.
+
+    cProfile хранит только пары вызывающий - вызываемый, поэтому стеки
+    восстанавливаются приблизительно: время функции делится между
+    вызывающими пропорционально их доле в её общем времени. Значения в
+    микросекундах.
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, cumulative))
+    lines = {}
+
+    def walk(function, budget, stack):
+        if budget < PROFILE_COLLAPSED_MIN_TIME:
+            return
+        _, _, own_time, cumulative, _ = stats.stats[function]
+        share = min(budget / cumulative, 1) if cumulative else 0
+        stack = (*stack, _format_function(function))
+        own_time *= share
+        micros = round(own_time * 1_000_000)
+        if micros:
+            key = ";".join(stack)
+            lines[key] = lines.get(key, 0) + micros
+        if len(stack) >= PROFILE_COLLAPSED_MAX_DEPTH:
+            return
+        children = [
+            (callee, callee_time * share)
+            for callee, callee_time in callees.get(function, ())
+            if _format_function(callee) not in stack
+        ]
+        total = sum(time for _, time in children)
+        available = max(budget - own_time, 0)
+        scale = available / total if total > available else 1
+        for callee, callee_time in children:
+            walk(callee, callee_time * scale, stack)
+
+    for function, (_, _, _, cumulative, callers) in stats.stats.items():
+        if not callers:
+            walk(function, cumulative, ())
+    return "".join(f"{stack} {micros}\n" for stack, micros in lines.items())
+
+
+def evict_profiles(max_count=PROFILES_MAX_COUNT):
+    """Удаляет самые старые профили, пока их больше max_count."""
+    profiles = []
+    with os.scandir(settings.PROFILES_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(PROFILE_EXTENSION):
+                continue
+            try:
+                profiles.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    profiles.sort()
+    for _, path in profiles[:max(len(profiles) - max_count, 0)]:
+        for extension in (PROFILE_EXTENSION, COLLAPSED_EXTENSION):
+            try:
+                os.remove(
+                    path[:-len(PROFILE_EXTENSION)] + extension
+                )
+            except FileNotFoundError:
+                pass
+
+
+def save_profile(profiler, name):
+    """Сохраняет профиль в формате pstats и в виде свёрнутых стеков."""
+    os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+    stats = pstats.Stats(profiler)
+    with open(
+        get_profile_path(name, COLLAPSED_EXTENSION), "w", encoding="utf-8"
+    ) as file:
+        file.write(get_collapsed_stacks(stats))
+    stats.dump_stats(get_profile_path(name))
+    evict_profiles()
+
+
+def list_profiles():
+    """Возвращает профили от новых к старым: (имя, время, размер)."""
+    if not os.path.isdir(settings.PROFILES_DIR):
+        return []
+    profiles = []
+    with os.scandir(settings.PROFILES_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(PROFILE_EXTENSION):
+                stat = entry.stat()
+                profiles.append(
+                    (
+                        entry.name[:-len(PROFILE_EXTENSION)],
+                        stat.st_mtime,
+                        stat.st_size,
+                    )
+                )
+    return sorted(profiles, key=lambda profile: profile[1], reverse=True)
+
+
+def format_profile(name, sort="cumulative", limit=30):
+    """Возвращает текстовый отчёт pstats по сохранённому профилю."""
+    output = StringIO()
+    pstats.Stats(get_profile_path(name), stream=output).sort_stats(
+        sort
+    ).print_stats(limit)
+    return output.getvalue()
+
+
+def profile_request(get_response, request):
+    """
+    Выполняет запрос под cProfile и сохраняет профиль.
+
+    Потоковый ответ читается целиком внутри профилирования, чтобы в
+    профиль попала и генерация содержимого. Имя профиля возвращается в
+    заголовке X-Profile.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        response = get_response(request)
+        if response.streaming:
+            response.streaming_content = [
+                b"".join(response.streaming_content)
+            ]
+    finally:
+        profiler.disable()
+    name = make_profile_name(request)
+    save_profile(profiler, name)
+    response["X-Profile"] = name
+    return response
@@ -0,0 +1,16 @@
+from django.http import Http404, HttpResponse
+
+from .metrics import is_enabled, render_metrics
+
+
+def metrics(request):
+    """
+    Отдаёт метрики всех процессов в текстовом формате Prometheus.
+
+    Адрес не проксируется nginx и доступен только внутри сети сервисов.
+    """
+    if not is_enabled():
+        raise Http404
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4"
+    )
@@ -50,13 +50,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "recipes.middleware.ShortLinkRedirectMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "foodgram_backend.urls"
@@ -145,6 +148,35 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Общий для всех воркеров кеш в таблице базы данных, таблица создаётся
+# командой createcachetable.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": os.getenv("CACHE_TABLE", "django_cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+SHOPPING_LIST_PDF_DIR = os.getenv(
+    "SHOPPING_LIST_PDF_DIR", os.path.join(BASE_DIR, "pdf_cache")
+)
+
+# Заголовок Server-Timing во всех ответах и пороги для записи медленных
+# запросов в лог, 0 - не записывать.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", 0))
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 0))
+
+# Каталог файлов метрик процессов для /metrics, по умолчанию метрики не
+# собираются. Файлы прошлого запуска удаляет хук on_starting из
+# gunicorn.conf.py.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+
+# Каталог профилей запросов, которые сотрудники запускают заголовком
+# X-Profile.
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(BASE_DIR, "profiles"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
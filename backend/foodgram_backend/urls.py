@@ -3,6 +3,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import include, path
 
+from core.views import metrics
 from recipes.views import handle_short_url
 
 
@@ -10,6 +11,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls", namespace="api")),
     path("s/<str:short_url>/", handle_short_url, name="short_url"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 
@@ -0,0 +1,11 @@
+import os
+
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram_backend.settings")
+
+
+def on_starting(server):
+    """Очищает каталог метрик до запуска воркеров."""
+    from core.metrics import clear_metrics_dir
+
+    clear_metrics_dir()
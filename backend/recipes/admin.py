@@ -57,6 +57,7 @@ class RecipeAdmin(admin.ModelAdmin):
         "favorites_count",
     )
     list_editable = ("name", "text", "image")
+    readonly_fields = ("favorites_count", "in_carts_count")
     search_fields = ("author__username", "name")
     list_filter = ("tags__slug",)
     list_per_page = OBJ_PER_PAGE
@@ -73,8 +74,3 @@ class RecipeAdmin(admin.ModelAdmin):
     def get_tags(self, obj):
         """Возвращает название тегов."""
         return ", ".join([tag.name for tag in obj.tags.all()])
-
-    @admin.display(description="Добавлений в избранное")
-    def favorites_count(self, obj):
-        """Возвращает кол-во добавлений рецепта в избранное."""
-        return obj.favorites.count()
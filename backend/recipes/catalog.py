@@ -0,0 +1,109 @@
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+
+from django.apps import apps
+from django.core.cache import cache
+
+from core.constants import CATALOG_IDS_TTL, CATALOG_VERSION_KEY
+
+
+IdsSnapshot = namedtuple("IdsSnapshot", ("version", "ids", "built_at"))
+
+
+def get_catalog_version():
+    """
+    Возвращает номер версии справочников тегов и ингредиентов.
+
+    Если номера в кеше нет, он заводится от текущего времени, чтобы не
+    совпасть с версией, по которой уже построены снимки в процессах.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog_ids():
+    """Увеличивает версию справочников, снимки id перестроятся."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class CatalogIds:
+    """
+    Отсортированный массив id справочника в памяти процесса.
+
+    Снимок перестраивается, когда меняется версия справочников в кеше или
+    проходит CATALOG_IDS_TTL секунд. Id, которых нет в снимке, перед
+    отказом проверяются по базе данных, поэтому только что добавленная
+    запись не будет ошибочно признана несуществующей.
+    """
+
+    def __init__(self, model_label):
+        self._model_label = model_label
+        self._lock = Lock()
+        self._snapshot = None
+
+    @property
+    def model(self):
+        return apps.get_model(self._model_label)
+
+    def build(self, version):
+        """Строит снимок по всем id справочника из базы данных."""
+        snapshot = IdsSnapshot(
+            version=version,
+            ids=array(
+                "q",
+                self.model.objects.order_by("id").values_list(
+                    "id", flat=True
+                ),
+            ),
+            built_at=monotonic(),
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def _is_stale(self, snapshot, version):
+        return (
+            snapshot is None
+            or snapshot.version != version
+            or monotonic() - snapshot.built_at > CATALOG_IDS_TTL
+        )
+
+    def get_snapshot(self):
+        """Возвращает актуальный снимок, при необходимости строит его."""
+        version = get_catalog_version()
+        snapshot = self._snapshot
+        if self._is_stale(snapshot, version):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._is_stale(snapshot, version):
+                    snapshot = self.build(version)
+        return snapshot
+
+    def get_missing(self, ids):
+        """Возвращает множество id, которых нет в справочнике."""
+        known = self.get_snapshot().ids
+        missing = set()
+        for pk in ids:
+            index = bisect_left(known, pk)
+            if index == len(known) or known[index] != pk:
+                missing.add(pk)
+        if missing:
+            missing -= set(
+                self.model.objects.filter(id__in=missing).values_list(
+                    "id", flat=True
+                )
+            )
+        return missing
+
+
+tag_ids = CatalogIds("recipes.Tag")
+ingredient_ids = CatalogIds("recipes.Ingredient")
@@ -0,0 +1,35 @@
+import re
+
+from django.urls import ResolverMatch
+
+from .views import handle_short_url
+from core.constants import SHORT_LINK_URL_PATH
+
+
+class ShortLinkRedirectMiddleware:
+    """
+    Обрабатывает короткие ссылки до остальных middleware.
+
+    Для перенаправления не нужны сессии, пользователь, CSRF и сообщения,
+    поэтому GET и HEAD запросы коротких ссылок обслуживаются сразу.
+    """
+
+    short_url_pattern = re.compile(
+        rf"^/{SHORT_LINK_URL_PATH}/(?P<short_url>[^/]+)/?$"
+    )
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD"):
+            match = self.short_url_pattern.match(request.path_info)
+            if match:
+                request.resolver_match = ResolverMatch(
+                    handle_short_url,
+                    (),
+                    match.groupdict(),
+                    url_name="short_url",
+                )
+                return handle_short_url(request, match["short_url"])
+        return self.get_response(request)
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+from recipes.utils import get_hashed_short_url
+
+
+def fill_short_codes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = []
+    for recipe in Recipe.objects.only('id').iterator():
+        recipe.short_code = get_hashed_short_url(recipe.id)
+        recipes.append(recipe)
+        if len(recipes) == 1000:
+            Recipe.objects.bulk_update(recipes, ['short_code'])
+            recipes = []
+    Recipe.objects.bulk_update(recipes, ['short_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True, verbose_name='Короткий код ссылки'),
+        ),
+        migrations.RunPython(fill_short_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_short_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='id рецепта')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Время удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+                'ordering': ('deleted_at', 'id'),
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Время изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at', 'id'], name='recipe_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipedeletion',
+            index=models.Index(fields=['deleted_at', 'id'], name='recipe_deletion_deleted_at_idx'),
+        ),
+    ]
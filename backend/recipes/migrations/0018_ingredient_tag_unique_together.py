@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_changes_feed'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='unique_ingredient',
+        ),
+        migrations.RemoveConstraint(
+            model_name='tag',
+            name='unique_tag',
+        ),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('name', 'measurement_unit')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together={('name', 'slug')},
+        ),
+    ]
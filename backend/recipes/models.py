@@ -6,12 +6,14 @@ from core.constants import (
     MAX_AMOUNT_INGREDIENTS,
     MAX_COOKING_TIME,
     MAX_NAME_LENGTH,
+    MAX_SHORT_CODE_LENGTH,
     MAX_TAG_NAME_LENGTH,
     MAX_SLUG_LENGTH,
     MAX_UNIT_LENGTH,
     MIN_AMOUNT_INGREDIENTS,
     MIN_COOKING_TIME,
 )
+from core.models import ProtectedFieldsMixin
 from .utils import get_hashed_short_url
 
 
@@ -54,7 +56,7 @@ class Ingredient(models.Model):
         return f"{self.name} {self.measurement_unit}"
 
 
-class Recipe(models.Model):
+class Recipe(ProtectedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -68,6 +70,12 @@ class Recipe(models.Model):
         upload_to="recipes/images/",
         verbose_name="Фото блюда",
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Уменьшенные копии фото",
+    )
     text = models.TextField(verbose_name="Описание рецепта")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -100,20 +108,67 @@ class Recipe(models.Model):
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name="Время добавления"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name="Время изменения"
+    )
+    short_code = models.CharField(
+        max_length=MAX_SHORT_CODE_LENGTH,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Короткий код ссылки",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Добавлений в избранное"
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Добавлений в список покупок"
+    )
+
+    protected_fields = ("image_variants", "favorites_count", "in_carts_count")
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-created_at",)
+        ordering = ("-created_at", "-id")
         unique_together = ("name", "author")
+        indexes = (
+            models.Index(
+                fields=("-created_at", "-id"), name="recipe_created_at_id_idx"
+            ),
+            models.Index(
+                fields=("updated_at", "id"), name="recipe_updated_at_id_idx"
+            ),
+        )
 
     def __str__(self):
         return f"{self.name}. Автор: {self.author.username}"
 
     @property
     def short_url(self):
-        short_url = get_hashed_short_url(self.id)
-        return short_url
+        return self.short_code or get_hashed_short_url(self.id)
+
+
+class RecipeDeletion(models.Model):
+    recipe_id = models.BigIntegerField(verbose_name="id рецепта")
+    deleted_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Время удаления"
+    )
+
+    class Meta:
+        verbose_name = "Удалённый рецепт"
+        verbose_name_plural = "Удалённые рецепты"
+        ordering = ("deleted_at", "id")
+        indexes = (
+            models.Index(
+                fields=("deleted_at", "id"),
+                name="recipe_deletion_deleted_at_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.recipe_id} ({self.deleted_at})"
 
 
 class RecipeIngredient(models.Model):
@@ -209,3 +264,31 @@ class Cart(models.Model):
 
     def __str__(self):
         return f"У {self.user.username} в корзине {self.recipe.name}"
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name="shopping_list",
+        on_delete=models.CASCADE,
+        verbose_name="Владелец списка",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name="shopping_list_items",
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+    )
+    amount = models.IntegerField(verbose_name="Общее количество")
+
+    class Meta:
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Ингредиенты в списке покупок"
+        ordering = ("user",)
+        unique_together = ("user", "ingredient")
+
+    def __str__(self):
+        return (
+            f"{self.amount} {self.ingredient.measurement_unit} "
+            f"{self.ingredient.name} у {self.user.username}"
+        )
@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+
+from core.constants import INGREDIENT_INDEX_TTL, INGREDIENTS_SEARCH_LIMIT
+
+
+IndexSnapshot = namedtuple(
+    "IndexSnapshot", ("keys", "entries", "offsets", "haystack", "built_at")
+)
+
+
+def normalize_ingredient_name(value):
+    """Приводит название к нижнему регистру и заменяет "ё" на "е"."""
+    return value.casefold().replace("ё", "е")
+
+
+class IngredientSearchIndex:
+    """
+    Индекс ингредиентов для автодополнения в памяти процесса.
+
+    Нормализованные названия хранятся в отсортированном кортеже, поэтому
+    совпадения по началу названия находятся бинарным поиском. Для поиска по
+    подстроке названия склеены в одну строку, а позиции начала каждого
+    названия хранятся в отдельном отсортированном кортеже.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+
+    def invalidate(self):
+        """Помечает индекс устаревшим, он перестроится при обращении."""
+        self._snapshot = None
+
+    def build(self):
+        """Строит индекс по всем ингредиентам из базы данных."""
+        from .models import Ingredient
+
+        rows = sorted(
+            (normalize_ingredient_name(name), id, name, measurement_unit)
+            for id, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        )
+        keys = tuple(row[0] for row in rows)
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        snapshot = IndexSnapshot(
+            keys=keys,
+            entries=tuple(row[1:] for row in rows),
+            offsets=tuple(offsets),
+            haystack="\n".join(keys),
+            built_at=monotonic(),
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def get_snapshot(self):
+        """Возвращает актуальный снимок индекса, при необходимости строит."""
+        snapshot = self._snapshot
+        if (
+            snapshot is None
+            or monotonic() - snapshot.built_at > INGREDIENT_INDEX_TTL
+        ):
+            with self._lock:
+                snapshot = self._snapshot
+                if (
+                    snapshot is None
+                    or monotonic() - snapshot.built_at > INGREDIENT_INDEX_TTL
+                ):
+                    snapshot = self.build()
+        return snapshot
+
+    @staticmethod
+    def _prefix_matches(snapshot, query):
+        start = bisect_left(snapshot.keys, query)
+        end = bisect_right(snapshot.keys, query + "\uffff", lo=start)
+        return range(start, end)
+
+    @staticmethod
+    def _substring_matches(snapshot, query, exclude, limit):
+        matches = []
+        haystack, offsets = snapshot.haystack, snapshot.offsets
+        position = haystack.find(query)
+        while position != -1 and len(matches) < limit:
+            index = bisect_right(offsets, position) - 1
+            if index not in exclude:
+                matches.append(index)
+            if index + 1 == len(offsets):
+                break
+            position = haystack.find(query, offsets[index + 1])
+        return matches
+
+    def search(self, query, limit=INGREDIENTS_SEARCH_LIMIT):
+        """
+        Возвращает ингредиенты, подходящие под запрос.
+
+        Сначала идут ингредиенты, название которых начинается с запроса,
+        затем те, где запрос встречается внутри названия. Пустой запрос
+        возвращает все ингредиенты.
+        """
+        snapshot = self.get_snapshot()
+        query = normalize_ingredient_name(query.strip()).replace("\n", " ")
+        if not query:
+            indexes = range(len(snapshot.entries))
+        else:
+            prefix = self._prefix_matches(snapshot, query)
+            indexes = list(prefix[:limit])
+            if len(indexes) < limit:
+                indexes += self._substring_matches(
+                    snapshot, query, prefix, limit - len(indexes)
+                )
+        return [
+            {"id": id, "name": name, "measurement_unit": measurement_unit}
+            for id, name, measurement_unit in (
+                snapshot.entries[index] for index in indexes
+            )
+        ]
+
+
+ingredient_index = IngredientSearchIndex()
@@ -0,0 +1,213 @@
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import Cart, Ingredient, RecipeIngredient, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Возвращает количества ингредиентов рецепта по их id."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredient_id", "amount"
+        )
+    )
+
+
+def get_recipes_amounts(recipe_ids):
+    """Возвращает суммарные количества ингредиентов нескольких рецептов."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values("ingredient_id")
+        .annotate(total=Sum("amount"))
+        .values_list("ingredient_id", "total")
+        .order_by()
+    )
+
+
+def _upsert_shopping_lists_postgresql(user_ids, deltas):
+    """
+    Прибавляет количества к спискам покупок одним INSERT ... ON CONFLICT.
+
+    Строки вставляются в порядке (user_id, ingredient_id), поэтому
+    параллельные запросы блокируют их в одном порядке и не создают
+    взаимных блокировок.
+    """
+    table = ShoppingListItem._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, ingredient_id, amount) "
+            "SELECT users.user_id, deltas.ingredient_id, deltas.amount "
+            "FROM unnest(%s::bigint[]) AS users (user_id) "
+            "CROSS JOIN unnest(%s::bigint[], %s::integer[]) "
+            "AS deltas (ingredient_id, amount) "
+            "ORDER BY users.user_id, deltas.ingredient_id "
+            "ON CONFLICT (user_id, ingredient_id) "
+            f"DO UPDATE SET amount = {table}.amount + EXCLUDED.amount",
+            (user_ids, list(deltas), list(deltas.values())),
+        )
+
+
+def change_shopping_lists(user_ids, deltas):
+    """
+    Изменяет списки покупок пользователей на заданные количества.
+
+    deltas - словарь {id ингредиента: изменение количества}. В PostgreSQL
+    строки добавляются или обновляются одним INSERT ... ON CONFLICT, так
+    что параллельное добавление одного ингредиента не нарушает
+    уникальность. В остальных СУБД существующие строки обновляются одним
+    UPDATE, недостающие создаются одним INSERT. Строки с неположительным
+    количеством удаляются.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids or not deltas:
+        return
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    if connection.vendor == "postgresql":
+        _upsert_shopping_lists_postgresql(user_ids, deltas)
+        if min(deltas.values()) < 0:
+            items.filter(amount__lte=0).delete()
+        return
+    existing = set(items.values_list("user_id", "ingredient_id"))
+    if existing:
+        items.update(
+            amount=F("amount")
+            + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                output_field=IntegerField(),
+            )
+        )
+        items.filter(amount__lte=0).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=delta
+        )
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient_id) not in existing
+    )
+
+
+def rebuild_shopping_lists(user_ids):
+    """
+    Пересобирает списки покупок пользователей по рецептам в их корзинах.
+
+    Нужна, когда корзина или ингредиенты рецептов меняются в обход API:
+    в админке, при каскадном удалении или прямой работе с моделями.
+    """
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    totals = (
+        RecipeIngredient.objects.filter(recipe__in_carts__user_id__in=user_ids)
+        .values("recipe__in_carts__user_id", "ingredient_id")
+        .annotate(total=Sum("amount"))
+        .values_list("recipe__in_carts__user_id", "ingredient_id", "total")
+        .order_by()
+    )
+    with transaction.atomic():
+        ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                )
+                for user_id, ingredient_id, total in totals
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_recipe_shopping_lists(recipe_id):
+    """Пересобирает списки покупок пользователей с рецептом в корзине."""
+    rebuild_shopping_lists(
+        Cart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    """Добавляет ингредиенты рецепта в список покупок пользователя."""
+    change_shopping_lists((user_id,), get_recipe_amounts(recipe_id))
+
+
+def add_recipes_to_shopping_list(user_id, recipe_ids):
+    """Добавляет ингредиенты нескольких рецептов в список покупок."""
+    change_shopping_lists((user_id,), get_recipes_amounts(recipe_ids))
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    """Вычитает ингредиенты рецепта из списка покупок пользователя."""
+    remove_recipe_from_shopping_lists((user_id,), recipe_id)
+
+
+def remove_recipes_from_shopping_list(user_id, recipe_ids):
+    """Вычитает ингредиенты нескольких рецептов из списка покупок."""
+    change_shopping_lists(
+        (user_id,),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_recipes_amounts(
+                recipe_ids
+            ).items()
+        },
+    )
+
+
+def remove_recipe_from_shopping_lists(user_ids, recipe_id):
+    """Вычитает ингредиенты рецепта из списков покупок пользователей."""
+    change_shopping_lists(
+        user_ids,
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+        },
+    )
+
+
+def update_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта в списки покупок."""
+    deltas = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    change_shopping_lists(
+        Cart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        ),
+        deltas,
+    )
+
+
+def get_aggregated_shopping_list(user_id):
+    """Возвращает список покупок, посчитанный по рецептам в корзине."""
+    return (
+        Ingredient.objects.filter(recipe__recipe__in_carts__user_id=user_id)
+        .values("id", "name", measurement=F("measurement_unit"))
+        .annotate(amount=Sum("recipe__amount"))
+        .order_by("name")
+    )
+
+
+def get_shopping_list(user_id):
+    """Возвращает сохранённый список покупок пользователя."""
+    return (
+        ShoppingListItem.objects.filter(user_id=user_id)
+        .values(
+            "amount",
+            name=F("ingredient__name"),
+            measurement=F("ingredient__measurement_unit"),
+        )
+        .order_by("name")
+    )
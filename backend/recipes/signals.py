@@ -0,0 +1,211 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import invalidate_catalog_ids
+from .models import (
+    Cart,
+    Ingredient,
+    Recipe,
+    RecipeDeletion,
+    RecipeIngredient,
+    Tag,
+)
+from .search import ingredient_index
+from .shopping_list import (
+    rebuild_recipe_shopping_lists,
+    rebuild_shopping_lists,
+)
+from .utils import (
+    get_deletions_cutoff,
+    get_hashed_short_url,
+    short_code_cache,
+)
+from core.constants import RECIPE_IMAGE_SIZES
+from core.images import schedule_image_variants
+
+
+User = get_user_model()
+
+AUTHOR_FIELDS = frozenset(
+    (
+        "username",
+        "email",
+        "first_name",
+        "last_name",
+        "avatar",
+        "avatar_variants",
+    )
+)
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет время изменения рецептов."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасывает индекс поиска ингредиентов при изменении справочника."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalog_ids_on_write(sender, **kwargs):
+    """Сбрасывает снимки id справочников при их изменении."""
+    transaction.on_commit(invalidate_catalog_ids)
+
+
+def _prep_author_field(name, value):
+    """Приводит значение поля пользователя к виду для записи в базу."""
+    return User._meta.get_field(name).get_prep_value(value)
+
+
+@receiver(pre_save, sender=User)
+def check_author_fields(sender, instance, update_fields, **kwargs):
+    """
+    Запоминает, меняет ли сохранение данные автора в ответе с рецептом.
+
+    Полное сохранение существующего пользователя записывает все поля
+    (см. ProtectedFieldsMixin), поэтому значения сравниваются с базой.
+    """
+    fields = AUTHOR_FIELDS if update_fields is None else (
+        AUTHOR_FIELDS & set(update_fields)
+    )
+    if instance._state.adding or not fields:
+        instance._author_changed = False
+        return
+    saved = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._author_changed = saved is None or any(
+        _prep_author_field(field, getattr(instance, field))
+        != _prep_author_field(field, value)
+        for field, value in saved.items()
+    )
+
+
+@receiver(post_save, sender=User)
+def touch_recipes_on_author_change(sender, instance, created, **kwargs):
+    """
+    Отмечает рецепты автора изменёнными при изменении его профиля.
+
+    Данные автора входят в ответ с рецептом, поэтому без этого списки
+    рецептов отдавали бы прежний ETag. Сохранения, не меняющие полей
+    профиля, например set_password или last_login, рецепты не затрагивают.
+    """
+    if created or not getattr(instance, "_author_changed", True):
+        return
+    touch_recipes(instance.recipes.values("pk"))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+def touch_recipes_on_catalog_change(sender, instance, created, **kwargs):
+    """Отмечает рецепты изменёнными при переименовании тега или ингредиента."""
+    if not created:
+        touch_recipes(instance.recipes.values("pk"))
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_recipes_on_tag_delete(sender, instance, **kwargs):
+    """
+    Отмечает рецепты изменёнными перед удалением их тега.
+
+    Связи с тегом удаляются каскадом без сигнала m2m_changed.
+    """
+    touch_recipes(instance.recipes.values("pk"))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def touch_recipe_on_ingredients_change(sender, instance, **kwargs):
+    """Отмечает рецепт изменённым при изменении его ингредиентов."""
+    touch_recipes((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_on_tags_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Отмечает рецепты изменёнными при изменении их тегов."""
+    if reverse:
+        if action == "pre_clear":
+            touch_recipes(instance.recipes.values("pk"))
+        elif action in ("post_add", "post_remove"):
+            touch_recipes(pk_set)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        touch_recipes((instance.pk,))
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(sender, instance, **kwargs):
+    """Ставит создание уменьшенных копий нового фото рецепта."""
+    schedule_image_variants(
+        instance,
+        "image",
+        "image_variants",
+        RECIPE_IMAGE_SIZES,
+        update_fields=("updated_at",),
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def set_recipe_short_code(sender, instance, created, **kwargs):
+    """Сохраняет короткий код ссылки нового рецепта."""
+    if instance.short_code is None:
+        instance.short_code = get_hashed_short_url(instance.pk)
+        Recipe.objects.filter(pk=instance.pk).update(
+            short_code=instance.short_code
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def record_recipe_deletion(sender, instance, **kwargs):
+    """
+    Сохраняет отметку об удалении рецепта для ленты изменений.
+
+    Заодно стирает отметки старше RECIPE_DELETION_RETENTION_DAYS дней:
+    клиенты с более старыми токенами всё равно синхронизируются заново.
+    """
+    RecipeDeletion.objects.filter(
+        deleted_at__lt=get_deletions_cutoff()
+    ).delete()
+    RecipeDeletion.objects.create(recipe_id=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_short_code(sender, instance, **kwargs):
+    """Убирает короткий код удалённого рецепта из кеша."""
+    if instance.short_code:
+        short_code_cache.invalidate(instance.short_code)
+
+
+@receiver((post_save, post_delete), sender=Cart)
+def rebuild_shopping_list_on_cart_change(sender, instance, **kwargs):
+    """
+    Пересобирает список покупок после изменения корзины через модели.
+
+    API меняет корзину и список покупок запросами без сигналов, сюда
+    попадают админка, каскадное удаление рецептов и пользователей и
+    прямая работа с ORM.
+    """
+    transaction.on_commit(
+        partial(rebuild_shopping_lists, (instance.user_id,))
+    )
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def rebuild_shopping_lists_on_ingredients_change(sender, instance, **kwargs):
+    """Пересобирает списки покупок с рецептом после смены его ингредиентов."""
+    transaction.on_commit(
+        partial(rebuild_recipe_shopping_lists, instance.recipe_id)
+    )
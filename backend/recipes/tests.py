@@ -0,0 +1,182 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from .models import (
+    Cart,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingListItem,
+)
+from .shopping_list import add_recipe_to_shopping_list, change_shopping_lists
+
+
+User = get_user_model()
+
+
+class RecipeCountersTest(TestCase):
+    """Полное сохранение рецепта не перезаписывает счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name="Рецепт",
+            image="recipes/images/recipe.png",
+            text="Описание",
+            cooking_time=10,
+        )
+
+    def test_save_keeps_concurrent_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=3, in_carts_count=2
+        )
+        User.objects.filter(pk=self.author.pk).update(recipes_count=5)
+        recipe.name = "Новое название"
+        recipe.save()
+        recipe.author.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, "Новое название")
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (3, 2)
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count, 5
+        )
+
+    def test_admin_form_excludes_counters(self):
+        request = RequestFactory().get("/")
+        request.user = User(is_staff=True, is_superuser=True)
+        form = site._registry[Recipe].get_form(request, self.recipe)
+        self.assertFalse(
+            {"favorites_count", "in_carts_count"} & set(form.base_fields)
+        )
+
+
+class ChangeShoppingListsTest(TestCase):
+    """Изменение сохранённых списков покупок на разницу количеств."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f"user{number}",
+                email=f"user{number}@example.com",
+                password="x",
+            )
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(2)
+        ]
+
+    def get_amounts(self):
+        return {
+            (item.user_id, item.ingredient_id): item.amount
+            for item in ShoppingListItem.objects.all()
+        }
+
+    def test_add_and_remove(self):
+        first, second = self.ingredients
+        user_ids = [user.pk for user in self.users]
+        change_shopping_lists(user_ids, {first.pk: 100})
+        change_shopping_lists(user_ids[:1], {first.pk: 50, second.pk: 10})
+        self.assertEqual(
+            self.get_amounts(),
+            {
+                (user_ids[0], first.pk): 150,
+                (user_ids[0], second.pk): 10,
+                (user_ids[1], first.pk): 100,
+            },
+        )
+        change_shopping_lists(user_ids, {first.pk: -100, second.pk: -10})
+        self.assertEqual(self.get_amounts(), {(user_ids[0], first.pk): 50})
+
+
+@mock.patch("recipes.signals.schedule_image_variants", mock.Mock())
+class ShoppingListSignalsTest(TestCase):
+    """Списки покупок обновляются при изменениях в обход API."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.user = User.objects.create_user(
+            username="user", email="user@example.com", password="x"
+        )
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(2)
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author,
+                name=f"Рецепт {number}",
+                image="recipes/images/recipe.png",
+                text="Описание",
+                cooking_time=10,
+            )
+            for number in range(2)
+        ]
+        for recipe in self.recipes:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in self.ingredients
+            )
+            Cart.objects.bulk_create((Cart(user=self.user, recipe=recipe),))
+            add_recipe_to_shopping_list(self.user.pk, recipe.pk)
+
+    def get_amounts(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+    def test_recipe_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        self.assertEqual(
+            self.get_amounts(),
+            {ingredient.pk: 100 for ingredient in self.ingredients},
+        )
+
+    def test_author_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.delete()
+        self.assertEqual(self.get_amounts(), {})
+
+    def test_cart_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Cart.objects.filter(recipe=self.recipes[1]).delete()
+        self.assertEqual(
+            self.get_amounts(),
+            {ingredient.pk: 100 for ingredient in self.ingredients},
+        )
+
+    def test_recipe_ingredient_change(self):
+        first, second = self.ingredients
+        with self.captureOnCommitCallbacks(execute=True):
+            item = RecipeIngredient.objects.get(
+                recipe=self.recipes[0], ingredient=first
+            )
+            item.amount = 30
+            item.save()
+            RecipeIngredient.objects.filter(
+                recipe=self.recipes[0], ingredient=second
+            ).delete()
+        self.assertEqual(self.get_amounts(), {first.pk: 130, second.pk: 100})
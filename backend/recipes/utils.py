@@ -1,6 +1,18 @@
+from collections import OrderedDict
+from datetime import timedelta
+from threading import Lock
+from time import monotonic
+
+from django.utils import timezone
 from hashids import Hashids
 
-from core.constants import MIN_LENGTH_FOR_SHORT_URL, SALT
+from core.constants import (
+    MIN_LENGTH_FOR_SHORT_URL,
+    RECIPE_DELETION_RETENTION_DAYS,
+    SALT,
+    SHORT_CODE_CACHE_SIZE,
+    SHORT_CODE_CACHE_TTL,
+)
 
 
 hashids = Hashids(min_length=MIN_LENGTH_FOR_SHORT_URL, salt=SALT)
@@ -11,6 +23,73 @@ def get_hashed_short_url(value):
     return hashids.encode(value)
 
 
-def get_decoded_short_url(value):
-    """Возвращает декодированный url адрес."""
-    return hashids.decode(value)
+def get_deletions_cutoff():
+    """Возвращает время, раньше которого отметки об удалении не хранятся."""
+    return timezone.now() - timedelta(days=RECIPE_DELETION_RETENTION_DAYS)
+
+
+class ShortCodeCache:
+    """
+    LRU-кеш соответствия коротких кодов и id рецептов в памяти процесса.
+
+    Записи живут не дольше SHORT_CODE_CACHE_TTL секунд, поэтому удаление
+    рецепта в другом процессе перестаёт влиять на перенаправления не позже
+    этого срока. В своём процессе запись сбрасывается сразу при удалении.
+    """
+
+    def __init__(
+        self, maxsize=SHORT_CODE_CACHE_SIZE, ttl=SHORT_CODE_CACHE_TTL
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, code):
+        """Возвращает id рецепта по коду или None, если записи нет."""
+        with self._lock:
+            item = self._items.get(code)
+            if item is None:
+                return None
+            recipe_id, stored_at = item
+            if monotonic() - stored_at > self.ttl:
+                del self._items[code]
+                return None
+            self._items.move_to_end(code)
+            return recipe_id
+
+    def set(self, code, recipe_id):
+        """Запоминает id рецепта, вытесняя самую старую запись."""
+        with self._lock:
+            self._items[code] = (recipe_id, monotonic())
+            self._items.move_to_end(code)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, code):
+        """Удаляет запись о коде."""
+        with self._lock:
+            self._items.pop(code, None)
+
+
+short_code_cache = ShortCodeCache()
+
+
+def get_recipe_id_by_short_code(code):
+    """
+    Возвращает id рецепта по короткому коду или None.
+
+    Сначала проверяется кеш процесса, затем индекс по коду в базе данных.
+    """
+    recipe_id = short_code_cache.get(code)
+    if recipe_id is None:
+        from .models import Recipe
+
+        recipe_id = (
+            Recipe.objects.filter(short_code=code)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if recipe_id is not None:
+            short_code_cache.set(code, recipe_id)
+    return recipe_id
@@ -1,21 +1,24 @@
 from django.http import HttpResponseNotFound, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
 
-from .utils import get_decoded_short_url
+from .utils import get_recipe_id_by_short_code
+from core.constants import SHORT_LINK_MAX_AGE
 
 
 def handle_short_url(request, short_url):
-    """Перенаправляет запрос с короткого URL."""
-    try:
-        decoded_values = get_decoded_short_url(short_url)
-        if decoded_values:
-            recipe_id = decoded_values[0]
-            return HttpResponseRedirect(
-                request.build_absolute_uri(f"/recipes/{recipe_id}/")
-            )
+    """
+    Перенаправляет запрос с короткого URL.
+
+    Перенаправление можно кешировать, поэтому повторные переходы по
+    общей ссылке может отдавать nginx.
+    """
+    recipe_id = get_recipe_id_by_short_code(short_url)
+    if recipe_id is None:
         return HttpResponseNotFound(
             "URL-адрес недействителен или срок его действия истек."
         )
-    except Exception as e:
-        return HttpResponseNotFound(
-            f"Произошла ошибка {e} при обработке URL-адреса."
-        )
+    response = HttpResponseRedirect(
+        request.build_absolute_uri(f"/recipes/{recipe_id}/")
+    )
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
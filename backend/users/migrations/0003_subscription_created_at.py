@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20240621_0815'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Время подписки'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customusermodel',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AlterField(
+            model_name='customusermodel',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+    ]
@@ -2,9 +2,10 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from core.constants import MAX_EMAIL_LENGTH, MAX_USER_NAME_LENGTH
+from core.models import ProtectedFieldsMixin
 
 
-class CustomUserModel(AbstractUser):
+class CustomUserModel(ProtectedFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=MAX_EMAIL_LENGTH, unique=True, verbose_name="email"
     )
@@ -17,6 +18,20 @@ class CustomUserModel(AbstractUser):
     avatar = models.ImageField(
         upload_to="users/images/", null=True, default=None
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Уменьшенные копии аватара",
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество рецептов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество подписчиков"
+    )
+
+    protected_fields = ("avatar_variants", "recipes_count", "followers_count")
 
     class Meta:
         verbose_name = "Пользователь"
@@ -44,6 +59,9 @@ class Subscription(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Автор рецепта",
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Время подписки"
+    )
 
     class Meta:
         verbose_name = "Подписка"
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import CustomUserModel
+from core.constants import AVATAR_SIZES
+from core.images import schedule_image_variants
+
+
+@receiver(post_save, sender=CustomUserModel)
+def build_avatar_variants(sender, instance, **kwargs):
+    """Ставит создание уменьшенных копий нового аватара."""
+    schedule_image_variants(
+        instance, "avatar", "avatar_variants", AVATAR_SIZES
+    )